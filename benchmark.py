@@ -0,0 +1,46 @@
+import argparse
+
+from pathlib import Path
+from datetime import datetime
+from lib.Filer import Filer
+from lib.Benchmark import Benchmark
+from lib.Errors import TracebackNotifier
+
+# guard entry point, since benchmark cases run in spawned processes
+if __name__ == "__main__":
+
+    # argparse
+    parser = argparse.ArgumentParser(prog="Scoring Machine Benchmark")
+    parser.add_argument("-t", "--tests", default="demo,demo_dic,core", help="comma separated list of tests")
+    parser.add_argument("-s", "--sizes", default="1000,100000,1000000,10000000", help="comma separated list of numbers of rows")
+    parser.add_argument("-m", "--missing_rate", type=float, default=0.05, help="share of missing answers")
+    parser.add_argument("-n", "--invalid_norms_rate", type=float, default=0.05, help="share of rows with invalid norms")
+    parser.add_argument("-e", "--expand_norms", choices=["0", "1"], default="0")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-r", "--report", default=None, help="path of json report (defaults to xerox/benchmark_<timestamp>.json)")
+    args = parser.parse_args()
+
+    try:
+        # init benchmark
+        benchmark = Benchmark(
+            tests=args.tests.split(","),
+            sizes=[ int(size) for size in args.sizes.split(",") ],
+            missing_rate=args.missing_rate,
+            invalid_norms_rate=args.invalid_norms_rate,
+            expand_norms=args.expand_norms == "1",
+            seed=args.seed,
+        )
+        # run benchmark
+        report = benchmark.run()
+        # determine report filepath
+        report_filepath = Path(args.report) if args.report else Filer().get_base_folderpath("xerox") / f"benchmark_{datetime.now():%Y%m%d_%H%M%S}.json"
+        # store report
+        benchmark.save(report, report_filepath)
+        # notify report filepath
+        print(f"Report stored in {report_filepath}")
+    # on error
+    except Exception as e:
+        # notify error message
+        print(e)
+        # notify traceback
+        TracebackNotifier(e).notify_traceback()
@@ -0,0 +1,101 @@
+import pandas as pd
+
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Iterator
+from lib.Loader import Loader
+from lib.Pipeline import Pipeline
+from lib.Dispatcher import Dispatcher
+from lib.Scorer import ScoreOutputs
+from lib.Errors import ValidationError
+
+class Batch():
+
+    def __init__(self, loader: Loader, tests: list[str], workers: int = 1) -> None:
+        self.loader = loader
+        self.tests = tests
+        self.workers = workers
+        # init one pipeline per test (loads test assets)
+        self.pipelines = { test: Pipeline(loader, test) for test in tests }
+        # if scoring should run on multiple processes, dispatch work of each test to a pool of workers
+        self.scoring_engines = { test: Dispatcher(pipeline, workers) if workers > 1 else pipeline for test, pipeline in self.pipelines.items() }
+
+    def get_column_groups(self, columns: pd.Index) -> tuple[list[str], dict[str, list[str]]]:
+        # init columns not belonging to any test (e.g., respondent ids) and columns of each test
+        other_columns, test_columns = [], { test: [] for test in self.pipelines }
+        # iterate over columns
+        for column in map(str, columns):
+            # get test of current column (i.e., columns are prefixed with test name, e.g. core_i1 or core_norms_id)
+            # (tests are tried by decreasing name length, so that demo_dic_i1 is matched to demo_dic rather than to demo)
+            test = next((test for test in sorted(self.tests, key=len, reverse=True) if column.startswith(f"{test}_")), None)
+            # store column
+            (test_columns[test] if test else other_columns).append(column)
+        # if some tests have no columns
+        if not all(test_columns.values()):
+            # raise error
+            raise ValidationError(f"No columns found for tests: {[ test for test, columns in test_columns.items() if not columns ]}.")
+        # return column groups
+        return other_columns, test_columns
+
+    def split(self, data: pd.DataFrame) -> tuple[pd.DataFrame, dict[str, pd.DataFrame]]:
+        # get column groups
+        other_columns, test_columns = self.get_column_groups(data.columns)
+        # return other columns and data of each test (prefixes are dropped and compact dtypes applied)
+        return data.loc[:, other_columns], {
+            test: self.loader.apply_dtypes(data.loc[:, columns].set_axis([ column[len(test) + 1:] for column in columns ], axis=1), self.pipelines[test].test_specs)
+                for test, columns in test_columns.items()
+        }
+
+    def collect(self, other_data: pd.DataFrame, tests_results: dict[str, pd.DataFrame | Future]) -> pd.DataFrame:
+        # init results (other columns first)
+        results = [ other_data ]
+        # iterate over results of each test, in requested order
+        for test, test_results in tests_results.items():
+            # if test results are being scored by a pool of workers, wait for them
+            scoring_engine = self.scoring_engines[test]
+            if isinstance(test_results, Future) and isinstance(scoring_engine, Dispatcher):
+                test_results = scoring_engine.collect(test_results.result())
+            # store results, prefixed with test name (e.g., core_raw_risk)
+            results.append(pd.DataFrame(test_results).add_prefix(f"{test}_"))
+        # return other columns followed by results of each test
+        return pd.concat(results, axis=1)
+
+    def score(self, data: pd.DataFrame, expand_norms: bool = False, outputs: ScoreOutputs | None = None) -> pd.DataFrame:
+        # split data by test
+        other_data, tests_data = self.split(data)
+        # return results of each test
+        return self.collect(other_data, { test: self.scoring_engines[test].score(test_data, expand_norms, outputs) for test, test_data in tests_data.items() })
+
+    def stream(self, data_filename: str, chunksize: int, expand_norms: bool = False, outputs: ScoreOutputs | None = None) -> Iterator[pd.DataFrame]:
+        # init queue of chunks being scored
+        pending = deque()
+        # iterate over chunks of data (dtypes are applied by test, once columns are split)
+        for data in self.loader.load_test_data_in_chunks(data_filename, chunksize):
+            # split chunk by test
+            other_data, tests_data = self.split(data)
+            # submit data of each test to its pool of workers (tests scored in current process are scored right away)
+            pending.append((other_data, {
+                test: scoring_engine.submit(test_data, expand_norms, outputs) if isinstance(scoring_engine, Dispatcher) else scoring_engine.score(test_data, expand_norms, outputs)
+                    for test, test_data in tests_data.items() for scoring_engine in [ self.scoring_engines[test] ]
+            }))
+            # if too many chunks are in flight (i.e., keep memory bounded)
+            if len(pending) >= self.workers * 2:
+                # yield oldest scored chunk
+                yield self.collect(*pending.popleft())
+        # yield remaining scored chunks in original order
+        while pending:
+            yield self.collect(*pending.popleft())
+
+    def close(self) -> None:
+        # shut down pools of workers of each test, if any
+        for scoring_engine in self.scoring_engines.values():
+            if isinstance(scoring_engine, Dispatcher):
+                scoring_engine.close()
+
+    def get_quality_report(self) -> dict[str, Any]:
+        # return data-quality report of each test
+        return { test: pipeline.quality_report.to_dict() for test, pipeline in self.pipelines.items() }
+
+    def get_summary_report(self) -> dict[str, Any]:
+        # return summary report of each test
+        return { test: pipeline.summary_report.to_dict() for test, pipeline in self.pipelines.items() }
@@ -0,0 +1,116 @@
+import time
+import json
+import platform
+import tempfile
+import subprocess
+import numpy as np
+import pandas as pd
+
+from pathlib import Path
+from datetime import datetime, timezone
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from lib.Filer import Filer, BASE_PATH
+from lib.Loader import Loader
+from lib.Pipeline import Pipeline
+from lib.Synthesizer import Synthesizer
+from lib.Writer import Writer
+from lib.Profiler import get_peak_rss_mb
+
+def get_rounded_peak_rss_mb() -> float | None:
+    # return peak rss rounded to 0.1 MiB (None where it can't be measured)
+    peak_rss_mb = get_peak_rss_mb()
+    return round(peak_rss_mb, 1) if peak_rss_mb is not None else None
+
+def run_case(test: str, rows: int, missing_rate: float, invalid_norms_rate: float, expand_norms: bool, seed: int) -> dict:
+    # init stages
+    stages: dict[str, dict] = {}
+    # function to time a stage
+    def time_stage(stage: str, stage_rows: int, fn, *args):
+        # run stage
+        start = time.perf_counter()
+        output = fn(*args)
+        seconds = time.perf_counter() - start
+        # store stage timing and memory
+        stages[stage] = { "seconds": round(seconds, 6), "rows": stage_rows, "rows_per_second": round(stage_rows / seconds, 1) if seconds and stage_rows else None, "peak_rss_mb": get_rounded_peak_rss_mb() }
+        # return stage output
+        return output
+    # init pipeline (loading test assets is timed as well)
+    pipeline = time_stage("load_test_assets", 0, Pipeline, Loader(Filer()), test)
+    # generate synthetic data
+    synthetic_data = time_stage("generate", rows, Synthesizer(pipeline.test_specs, seed).generate, rows, missing_rate, invalid_norms_rate)
+    # use a temporary folder for input and output files
+    with tempfile.TemporaryDirectory() as temp_folderpath:
+        # store synthetic data as csv
+        data_filepath = Path(temp_folderpath) / f"data_{test}.csv"
+        synthetic_data.to_csv(data_filepath, index=False)
+        del synthetic_data
+        # load data
+        test_data = time_stage("load", rows, pipeline.loader.read_data, data_filepath, pipeline.test_specs)
+        # sanitize data
+        sanitized_test_data = time_stage("sanitize", rows, pipeline.sanitize, test_data)
+        del test_data
+        # score data
+        test_results = time_stage("score", rows, pipeline.score_sanitized, sanitized_test_data, expand_norms)
+        del sanitized_test_data
+        # write results
+        time_stage("write", rows, Writer(Path(temp_folderpath) / f"data_{test}_scored.csv").write, test_results)
+    # return case results
+    return { "test": test, "rows": rows, "stages": stages, "peak_rss_mb": get_rounded_peak_rss_mb() }
+
+class Benchmark():
+
+    def __init__(self, tests: list[str], sizes: list[int], missing_rate: float = 0.05, invalid_norms_rate: float = 0.05, expand_norms: bool = False, seed: int = 0) -> None:
+        self.tests = tests
+        self.sizes = sizes
+        self.missing_rate = missing_rate
+        self.invalid_norms_rate = invalid_norms_rate
+        self.expand_norms = expand_norms
+        self.seed = seed
+
+    def get_environment(self) -> dict:
+        try:
+            # get current commit, so that reports can be compared between commits
+            commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=BASE_PATH, capture_output=True, text=True, check=True).stdout.strip()
+        # on error (i.e., not a git repository)
+        except Exception:
+            commit = None
+        # return environment
+        return {
+            "commit": commit,
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+        }
+
+    def run(self) -> dict:
+        # init results
+        results = []
+        # iterate over benchmark cases
+        for test in self.tests:
+            for rows in self.sizes:
+                # run case in a fresh process, so that peak memory is measured for current case only
+                with ProcessPoolExecutor(1, mp_context=get_context("spawn")) as pool:
+                    results.append(pool.submit(run_case, test, rows, self.missing_rate, self.invalid_norms_rate, self.expand_norms, self.seed).result())
+                # notify progress
+                print(f"{test} {rows} rows: " + ", ".join(f"{stage} {timing['seconds']:.3f}s" for stage, timing in results[-1]["stages"].items()))
+        # return report
+        return {
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "environment": self.get_environment(),
+            "config": {
+                "tests": self.tests,
+                "sizes": self.sizes,
+                "missing_rate": self.missing_rate,
+                "invalid_norms_rate": self.invalid_norms_rate,
+                "expand_norms": self.expand_norms,
+                "seed": self.seed,
+            },
+            "results": results,
+        }
+
+    def save(self, report: dict, report_filepath: Path) -> None:
+        # store report as json
+        with report_filepath.open("w") as fout:
+            json.dump(report, fout, indent=2)
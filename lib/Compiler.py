@@ -0,0 +1,235 @@
+import json
+import hashlib
+import numpy as np
+import pandas as pd
+
+from pathlib import Path
+from typing import Any
+from lib.Filer import open_atomic
+from lib.Registry import hash_specs
+
+# compiled artifacts are stored next to their source file with this suffix
+COMPILED_SUFFIX = ".compiled.npz"
+# norms columns that hold standard scores
+NORMS_FIELDS = ["std", "std_interpretation"]
+
+class CompiledSpecs():
+
+    def __init__(self, specs_hash: str, meta: dict[str, Any], straight_items: np.ndarray, reversed_items: np.ndarray) -> None:
+        # store content hash of the source specifications
+        self.hash = specs_hash
+        # store scalar metadata
+        self.meta = meta
+        self.length: int = meta["length"]
+        self.scales: list[str] = meta["scales"]
+        self.norms: list[str] = meta["norms"]
+        self.likert_min: int = meta["likert_min"]
+        self.likert_max: int = meta["likert_max"]
+        # reversed items are scored as |answer - (likert.min + likert.max)|
+        self.reversal_offset: int = self.likert_min + self.likert_max
+        # store item-by-scale weight matrices (items x scales, int8)
+        self.straight = straight_items
+        self.reversed = reversed_items
+        # store number of straight/reversed items by scale
+        self.count_straight = straight_items.sum(axis=0, dtype=np.int64)
+        self.count_reversed = reversed_items.sum(axis=0, dtype=np.int64)
+
+    def save(self, filepath: Path) -> None:
+        # atomically store matrices and metadata into a single uncompressed npz archive (concurrent runs never see a partial file)
+        with open_atomic(filepath, "wb") as fout:
+            np.savez(fout, hash=np.array(self.hash), meta=np.array(json.dumps(self.meta)), straight=self.straight, reversed=self.reversed)
+
+    @classmethod
+    def load(cls, filepath: Path) -> "CompiledSpecs":
+        # load npz archive (no pickled objects allowed)
+        with np.load(filepath, allow_pickle=False) as archive:
+            return cls(str(archive["hash"]), json.loads(str(archive["meta"])), archive["straight"], archive["reversed"])
+
+class SpecsCompiler():
+
+    # in-memory cache of compiled specifications, keyed by content hash
+    cache: dict[str, CompiledSpecs] = {}
+
+    @staticmethod
+    def hash_specs(data: dict) -> str:
+        # hash specifications (same hash stored in the test registry)
+        return hash_specs(data)
+
+    @staticmethod
+    def get_compiled_filepath(specs_filepath: Path) -> Path:
+        # compiled specs sit next to <test>_specs.json
+        return specs_filepath.with_name(f"{specs_filepath.stem}{COMPILED_SUFFIX}")
+
+    def build(self, data: dict, specs_hash: str) -> CompiledSpecs:
+        # get test length and scales
+        length = data.get("length", 0)
+        scales = data.get("scales", [])
+        # init item-by-scale matrices
+        straight_items = np.zeros((length, len(scales)), dtype=np.int8)
+        reversed_items = np.zeros((length, len(scales)), dtype=np.int8)
+        # iterate over scales
+        for scale_index, (_, straight_items_indices, reversed_items_indices) in enumerate(scales):
+            # "switch to 1" items belonging to current scale (items are 1-based while matrices are 0-based)
+            straight_items[np.asarray(straight_items_indices, dtype=np.intp) - 1, scale_index] = 1
+            reversed_items[np.asarray(reversed_items_indices, dtype=np.intp) - 1, scale_index] = 1
+        # collect scalar metadata
+        meta = {
+            "length": length,
+            "scales": [ scale[0] for scale in scales ],
+            "norms": data.get("norms", []),
+            "likert_min": data.get("likert", {}).get("min", 0),
+            "likert_max": data.get("likert", {}).get("max", 0),
+        }
+        # return compiled specs
+        return CompiledSpecs(specs_hash, meta, straight_items, reversed_items)
+
+    def compile(self, data: dict, specs_filepath: Path | None = None) -> CompiledSpecs:
+        # hash specifications
+        specs_hash = self.hash_specs(data)
+        # if specifications were already compiled in this process
+        if specs_hash in self.cache:
+            # return them
+            return self.cache[specs_hash]
+        # init compiled specs
+        compiled_specs = None
+        # determine compiled filepath, if specifications come from disk
+        compiled_filepath = self.get_compiled_filepath(specs_filepath) if specs_filepath else None
+        # if a compiled artifact exists on disk
+        if compiled_filepath and compiled_filepath.exists():
+            try:
+                # load it
+                compiled_specs = CompiledSpecs.load(compiled_filepath)
+            # on error (i.e., corrupted or outdated artifact)
+            except Exception:
+                # ignore it, it will be rebuilt
+                compiled_specs = None
+        # if compiled artifact is missing or stale
+        if compiled_specs is None or compiled_specs.hash != specs_hash:
+            # rebuild it
+            compiled_specs = self.build(data, specs_hash)
+            # if specifications come from disk
+            if compiled_filepath:
+                try:
+                    # store compiled artifact next to the specifications
+                    compiled_specs.save(compiled_filepath)
+                # on error (i.e., read-only tests folder)
+                except OSError:
+                    # keep in-memory artifact only
+                    pass
+        # cache compiled specs
+        self.cache[specs_hash] = compiled_specs
+        # return compiled specs
+        return compiled_specs
+
+class CompiledNorms():
+
+    def __init__(self, norms_hash: str, norms_ids: list[str], scales: list[str], raw_min: int, tables: dict[str, np.ndarray], categories: dict[str, list], integer_fields: list[str]) -> None:
+        # store content hash of the source norms
+        self.hash = norms_hash
+        # store norms ids and scales (i.e., first and second axes of lookup tables)
+        self.norms_ids = norms_ids
+        self.norms_index = { norms_id: index for index, norms_id in enumerate(norms_ids) }
+        self.scales = scales
+        # store raw score corresponding to the first cell of the third axis of lookup tables
+        self.raw_min = raw_min
+        # store lookup tables (norms_id x scale x raw), one for each norms field
+        # numeric fields hold NaN where no norms are available, categorical fields hold -1
+        self.tables = tables
+        # store categories of categorical fields (i.e., interpretation labels)
+        self.categories = categories
+        # store numeric fields whose values are all integers
+        self.integer_fields = integer_fields
+
+    @property
+    def fields(self) -> list[str]:
+        return list(self.tables.keys())
+
+    def get_norms_indices(self, norms_ids: str) -> list[int]:
+        # get indices of requested norms (space separated, sorted by norms id), skipping unknown ones
+        return [ self.norms_index[norms_id] for norms_id in sorted(set(norms_ids.split(" "))) if norms_id in self.norms_index ]
+
+    def lookup(self, field: str, norms_index: int, raw_scores: np.ndarray, scale_indices: list[int] | None = None) -> np.ndarray:
+        # get lookup table of requested field and norms
+        table = self.tables[field][norms_index]
+        # determine raw cells, clipping raw scores falling outside norms (nearest match is the boundary)
+        raw_cells = np.clip(raw_scores - self.raw_min, 0, table.shape[1] - 1)
+        # gather values for all scales at once (raw_scores is rows x scales, either all scales or the requested ones)
+        return table[np.arange(table.shape[0]) if scale_indices is None else scale_indices, raw_cells]
+
+class NormsCompiler():
+
+    # in-memory cache of compiled norms, keyed by specs and norms hashes
+    cache: dict[tuple[str, str], CompiledNorms] = {}
+
+    @staticmethod
+    def hash_norms(norms: pd.DataFrame) -> str:
+        # hash norms values and labels
+        hasher = hashlib.sha256(json.dumps(list(map(str, norms.columns))).encode())
+        hasher.update(pd.util.hash_pandas_object(norms, index=False).to_numpy().tobytes()) # type: ignore
+        # return hash
+        return hasher.hexdigest()
+
+    @staticmethod
+    def get_nearest_indices(norms_raw: np.ndarray, raw_scores: np.ndarray) -> np.ndarray:
+        # find closest norms raw score at or above each raw score
+        forward = np.clip(np.searchsorted(norms_raw, raw_scores, side="left"), 0, len(norms_raw) - 1)
+        # find closest norms raw score at or below each raw score
+        backward = np.clip(np.searchsorted(norms_raw, raw_scores, side="right") - 1, 0, len(norms_raw) - 1)
+        # pick the nearest one, preferring the lower one on ties (as merge_asof does)
+        return np.where(np.abs(norms_raw[forward] - raw_scores) < np.abs(raw_scores - norms_raw[backward]), forward, backward)
+
+    def build(self, compiled_specs: CompiledSpecs, norms: pd.DataFrame, norms_hash: str) -> CompiledNorms:
+        # get scales and norms fields
+        scales = compiled_specs.scales
+        fields = [ field for field in NORMS_FIELDS if field in norms.columns ]
+        # keep norms referring to known scales, dropping duplicated raw scores (first one wins)
+        norms = norms[norms["scale"].isin(scales)].drop_duplicates(subset=["norms_id", "scale", "raw"]) if not norms.empty else norms # type: ignore
+        # get norms ids (sorted, so that lookups follow the order of requested norms)
+        norms_ids = sorted(norms["norms_id"].unique()) if not norms.empty else []
+        # determine raw scores covered by lookup tables
+        raw_min = int(np.floor(norms["raw"].min())) if not norms.empty else 0
+        raw_max = int(np.ceil(norms["raw"].max())) if not norms.empty else 0
+        raw_scores = np.arange(raw_min, raw_max + 1)
+        # init lookup tables and categories
+        shape = (len(norms_ids), len(scales), len(raw_scores))
+        tables: dict[str, np.ndarray] = {}
+        categories: dict[str, list] = {}
+        integer_fields: list[str] = []
+        # iterate over norms fields
+        for field in fields:
+            # if field is numeric
+            if pd.api.types.is_numeric_dtype(norms[field]):
+                # init table with NaNs
+                tables[field] = np.full(shape, np.nan)
+                # keep track of integer fields
+                if pd.api.types.is_integer_dtype(norms[field]):
+                    integer_fields.append(field)
+            # otherwise
+            else:
+                # convert field to categorical codes
+                codes, uniques = pd.factorize(norms[field])
+                categories[field] = list(uniques)
+                norms = norms.assign(**{ field: codes })
+                # init table with -1 (i.e., missing category)
+                tables[field] = np.full(shape, -1, dtype=np.int32)
+        # iterate over norms grouped by norms id and scale
+        for (norms_id, scale), group in norms.groupby(["norms_id", "scale"], sort=False): # type: ignore
+            # sort group by raw scores
+            group = group.sort_values(by="raw", kind="stable")
+            # find the nearest norms row for each raw score
+            nearest_indices = self.get_nearest_indices(group["raw"].to_numpy(dtype=np.float64), raw_scores)
+            # fill lookup tables
+            for field in fields:
+                tables[field][norms_ids.index(norms_id), scales.index(scale)] = group[field].to_numpy()[nearest_indices]
+        # return compiled norms
+        return CompiledNorms(norms_hash, norms_ids, scales, raw_min, tables, categories, integer_fields)
+
+    def compile(self, compiled_specs: CompiledSpecs, norms: pd.DataFrame) -> CompiledNorms:
+        # determine cache key
+        cache_key = (compiled_specs.hash, self.hash_norms(norms))
+        # if norms were not compiled yet in this process
+        if cache_key not in self.cache:
+            # compile them
+            self.cache[cache_key] = self.build(compiled_specs, norms, cache_key[1])
+        # return compiled norms
+        return self.cache[cache_key]
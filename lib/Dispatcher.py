@@ -0,0 +1,146 @@
+import numpy as np
+import pandas as pd
+
+from collections import deque
+from itertools import repeat
+from pathlib import Path
+from typing import Iterator
+from concurrent.futures import Future, ProcessPoolExecutor
+from lib.Filer import Filer
+from lib.Loader import Loader
+from lib.Pipeline import Pipeline
+from lib.Scorer import ScoreOutputs
+from lib.Summary import SummaryReport
+from lib.Store import ResponseStore
+from lib.Profiler import PROFILER
+
+# pipeline of current worker process (set once by the pool initializer)
+worker_pipeline: Pipeline | None = None
+# response stores opened by current worker process, by folderpath
+worker_stores: dict[Path, ResponseStore] = {}
+
+def init_worker(test: str, profile: bool) -> None:
+    global worker_pipeline
+    # profile worker stages if parent process does (dropping totals inherited from a forked parent)
+    PROFILER.reset()
+    if profile:
+        PROFILER.enable()
+    # load test assets once per worker (compiled specs are read from their on-disk artifact)
+    worker_pipeline = Pipeline(Loader(Filer()), test)
+    # warm up compiled norms
+    worker_pipeline.compiled_norms
+
+def collect_worker_state() -> tuple[dict, SummaryReport]:
+    # collect stages profiled by current worker
+    profiled_stages = PROFILER.totals
+    PROFILER.reset()
+    # collect summary report accumulated by current worker
+    summary_report = worker_pipeline.summary_report # type: ignore
+    worker_pipeline.summary_report = SummaryReport() # type: ignore
+    # return profiled stages and summary report
+    return profiled_stages, summary_report
+
+def score_shard(sanitized_test_data: pd.DataFrame, expand_norms: bool, outputs: ScoreOutputs | None = None) -> tuple[pd.DataFrame, dict, SummaryReport]:
+    # score shard with the pipeline of current worker
+    test_results = worker_pipeline.score_sanitized(sanitized_test_data, expand_norms, outputs=outputs) # type: ignore
+    # return results, along with stages profiled and summary accumulated while scoring the shard
+    return test_results, *collect_worker_state()
+
+def score_store_shard(store_folderpath: Path, start: int, stop: int, expand_norms: bool, outputs: ScoreOutputs | None = None) -> tuple[pd.DataFrame, dict, SummaryReport]:
+    # open store once per worker (its pages are shared with all processes mapping it)
+    store = worker_stores.setdefault(store_folderpath, ResponseStore(store_folderpath))
+    # score shard rows with the pipeline of current worker
+    test_results = worker_pipeline.score_store_rows(store, start, stop, expand_norms, outputs) # type: ignore
+    # return results, along with stages profiled and summary accumulated while scoring the shard
+    return test_results, *collect_worker_state()
+
+class Dispatcher():
+
+    def __init__(self, pipeline: Pipeline, workers: int) -> None:
+        self.pipeline = pipeline
+        self.workers = workers
+        # init pool of workers (opened on first use, then reused by every call until closed)
+        self.pool: ProcessPoolExecutor | None = None
+
+    def get_pool(self) -> ProcessPoolExecutor:
+        # if pool is not open yet
+        if self.pool is None:
+            # open a pool of workers sharing compiled test assets (workers load them once, whatever the number of chunks)
+            self.pool = ProcessPoolExecutor(self.workers, initializer=init_worker, initargs=(self.pipeline.test, PROFILER.enabled))
+        # return pool
+        return self.pool
+
+    def close(self) -> None:
+        # if a pool is open
+        if self.pool is not None:
+            # shut it down
+            self.pool.shutdown()
+            self.pool = None
+
+    def split(self, sanitized_test_data: pd.DataFrame) -> list[pd.DataFrame]:
+        # determine number of shards (a few per worker, to balance load)
+        number_of_shards = max(1, min(len(sanitized_test_data), self.workers * 4))
+        # split data into contiguous row shards
+        return [ sanitized_test_data.iloc[rows[0]:rows[-1] + 1] for rows in np.array_split(np.arange(len(sanitized_test_data)), number_of_shards) if len(rows) ]
+
+    def collect(self, scored_shard: tuple[pd.DataFrame, dict, SummaryReport]) -> pd.DataFrame:
+        # get shard results, along with stages profiled and summary accumulated by the worker
+        test_results, profiled_stages, summary_report = scored_shard
+        # merge profiled stages into the ones of current process
+        PROFILER.merge(profiled_stages)
+        # merge summary report into the one of current pipeline
+        self.pipeline.summary_report.add(summary_report)
+        # return shard results
+        return test_results
+
+    def submit(self, test_data: pd.DataFrame, expand_norms: bool = False, outputs: ScoreOutputs | None = None) -> Future:
+        # sanitize data in current process (data-quality report is accumulated in original order), then score them on a worker
+        return self.get_pool().submit(score_shard, self.pipeline.sanitize(test_data), expand_norms, outputs)
+
+    def score(self, test_data: pd.DataFrame, expand_norms: bool = False, outputs: ScoreOutputs | None = None) -> pd.DataFrame:
+        # sanitize data once, so that all shards share the same dtypes
+        sanitized_test_data = self.pipeline.sanitize(test_data)
+        # split sanitized data into shards
+        shards = self.split(sanitized_test_data)
+        # if there is nothing to split
+        if len(shards) < 2:
+            # score data in current process
+            return self.pipeline.score_sanitized(sanitized_test_data, expand_norms, outputs=outputs)
+        # score shards in parallel
+        test_results = [ self.collect(scored_shard) for scored_shard in self.get_pool().map(score_shard, shards, repeat(expand_norms), repeat(outputs)) ]
+        # return results merged back in original order
+        return pd.concat(test_results)
+
+    def stream(self, data_filename: str, chunksize: int, expand_norms: bool = False, outputs: ScoreOutputs | None = None) -> Iterator[pd.DataFrame]:
+        # init queue of chunks being scored
+        pending = deque()
+        # iterate over chunks of test data
+        for test_data in self.pipeline.loader.load_test_data_in_chunks(data_filename, chunksize, self.pipeline.test_specs):
+            # submit chunk to the pool, scoring chunks in parallel
+            pending.append(self.submit(test_data, expand_norms, outputs))
+            # if too many chunks are in flight (i.e., keep memory bounded)
+            if len(pending) >= self.workers * 2:
+                # yield oldest scored chunk
+                yield self.collect(pending.popleft().result())
+        # yield remaining scored chunks in original order
+        while pending:
+            yield self.collect(pending.popleft().result())
+
+    def score_store(self, store: ResponseStore, chunksize: int = 0, expand_norms: bool = False, outputs: ScoreOutputs | None = None) -> Iterator[pd.DataFrame]:
+        # make sure store matches test specifications
+        store.check(self.pipeline.test_specs)
+        # init queue of shards being scored
+        pending = deque()
+        # get pool of workers
+        pool = self.get_pool()
+        # iterate over row ranges of shards (a few per worker, if data should be scored all at once)
+        for start, stop in store.iter_rows(chunksize or -(-store.rows // (self.workers * 4))):
+            # submit shard to the pool, scoring shards in parallel (workers map the store, only row ranges are sent to them)
+            pending.append(pool.submit(score_store_shard, store.folderpath, start, stop, expand_norms, outputs))
+            # if too many shards are in flight (i.e., keep memory bounded)
+            if len(pending) >= self.workers * 2:
+                # yield oldest scored shard
+                yield self.collect(pending.popleft().result())
+        # yield remaining scored shards in original order
+        while pending:
+            yield self.collect(pending.popleft().result())
@@ -1,5 +1,8 @@
 import os
+import json
 from pathlib import Path
+from typing import IO, Any, Iterator
+from contextlib import contextmanager
 from lib.Errors import NotFoundError
 
 # constants
@@ -8,40 +11,58 @@ LIB_PATH = BASE_PATH / "lib"
 TESTS_PATH =  LIB_PATH / "tests"
 DATA_PATH = BASE_PATH / "data"
 XEROX_PATH = BASE_PATH / "xerox"
+# supported data formats and their file extensions
+DATA_FORMATS = { "csv": ".csv", "parquet": ".parquet", "feather": ".feather" }
+# file extension of memory-mapped response stores (input only)
+STORE_SUFFIX = ".store"
+
+@contextmanager
+def open_atomic(filepath: Path, mode: str = "w") -> Iterator[IO[Any]]:
+    # write to a process-specific temporary file first, so that concurrent readers (e.g., other runs or nodes) never see a partial file
+    temp_filepath = filepath.with_name(f"{filepath.name}.{os.getpid()}.tmp")
+    try:
+        with temp_filepath.open(mode) as fout:
+            yield fout
+        # atomically replace previous file
+        os.replace(temp_filepath, filepath)
+    finally:
+        # remove temporary file, if still there (i.e., on error)
+        temp_filepath.unlink(missing_ok=True)
+
+def save_json(data: dict[str, Any], filepath: Path) -> None:
+    # atomically write data as indented json
+    with open_atomic(filepath) as fout:
+        json.dump(data, fout, indent=2)
 
 class Filer(object):
 
     def __init__(self) -> None:
-        self.base_folderpaths: dict[str, Path] = self.set_base_folderpaths()
-
-    def set_base_folderpaths(self):
-        # define relevant paths
-        base_folderpaths = {
+        # define relevant paths (they are checked lazily, when first requested)
+        self.base_folderpaths: dict[str, Path] = {
             "cwd": BASE_PATH,
             "data" : DATA_PATH,
             "xerox" : XEROX_PATH,
             "lib" : LIB_PATH,
             "tests": TESTS_PATH
         }
-        # if all relevant paths exist
-        if all(map(lambda f: f.exists(), base_folderpaths.values())):
-            # return them
-            return base_folderpaths
-        # otherwise
-        else:
-            # raise error
-            raise NotFoundError(f"Missing paths: {[ str(f) for f in base_folderpaths.values() if not f.exists() ]}.")
+        # init paths known to exist
+        self.checked_folderpaths: set[str] = set()
 
     def get_base_folderpath(self, folderpath: str = "all") -> Path:
-        # if user requests a valid specific path
-        if folderpath in self.base_folderpaths.keys():
-            # return it
-            return self.base_folderpaths[folderpath]
-        # otherwise
-        else:
+        # if user requests an invalid specific path
+        if folderpath not in self.base_folderpaths.keys():
             # raise error
             raise NotFoundError(f"'{folderpath}' doesn't exist.")
-
+        # if requested path wasn't checked yet
+        if folderpath not in self.checked_folderpaths:
+            # if requested path doesn't exist
+            if not self.base_folderpaths[folderpath].exists():
+                # raise error
+                raise NotFoundError(f"Missing paths: {[ str(self.base_folderpaths[folderpath]) ]}.")
+            # mark path as checked
+            self.checked_folderpaths.add(folderpath)
+        # return it
+        return self.base_folderpaths[folderpath]
 
     def get_test_folderpath(self, test : str) -> Path:
         # determine test folderpath
@@ -0,0 +1,96 @@
+import numpy as np
+
+from typing import Collection
+from lib.Compiler import CompiledSpecs
+from lib.Profiler import PROFILER
+
+# scores computed by the kernel
+KERNEL_SCORES = ("missing", "raw", "corrected_raw", "mean")
+
+class ScoringKernel():
+
+    def __init__(self, compiled_specs: CompiledSpecs, scale_indices: list[int] | None = None) -> None:
+        self.compiled_specs = compiled_specs
+        # determine scored scales (all of them, unless otherwise requested)
+        self.scale_indices = list(range(len(compiled_specs.scales))) if scale_indices is None else scale_indices
+        # cast weight matrices of scored scales once, so that matrix multiplications run on BLAS
+        self.straight = compiled_specs.straight[:, self.scale_indices].astype(np.float64)
+        self.reversed = compiled_specs.reversed[:, self.scale_indices].astype(np.float64)
+        # stack straight/reversed matrices to count missing items with a single product
+        self.straight_and_reversed = np.hstack([ self.straight, self.reversed ]).astype(np.float32)
+        # store number of straight/reversed items by scale
+        self.count_straight = compiled_specs.count_straight[self.scale_indices].astype(np.float64)
+        self.count_reversed = compiled_specs.count_reversed[self.scale_indices].astype(np.float64)
+
+    def score(self, answers: np.ndarray, missing_mask: np.ndarray | None = None, scores: Collection[str] = KERNEL_SCORES) -> dict[str, np.ndarray]:
+        # get number of scored scales
+        number_of_scales = len(self.scale_indices)
+        # if missing answers are not masked explicitly
+        if missing_mask is None:
+            # make sure answers are a contiguous float buffer (NaN marks missing answers)
+            answers = np.ascontiguousarray(answers, dtype=np.float64)
+        # compute missing answers mask, unless given along with answers (e.g., integer answers read from a response store)
+        missing_mask = np.isnan(answers) if missing_mask is None else missing_mask
+        # init results
+        results: dict[str, np.ndarray] = {}
+        # if missing items are requested, or needed to compute corrected raw and mean scores
+        if not { "missing", "corrected_raw", "mean" }.isdisjoint(scores):
+            # count missing items
+            with PROFILER.stage("scorer.missing", len(answers)):
+                # compute missing items by scale (straight and reversed) with one product
+                missing = (missing_mask.astype(np.float32) @ self.straight_and_reversed).astype(np.int64)
+                missing_straight, missing_reversed = missing[:, :number_of_scales], missing[:, number_of_scales:]
+            # add missing items to results
+            results.update({
+                "missing_straight": missing_straight,
+                "missing_reversed": missing_reversed,
+                "missing": missing_straight + missing_reversed,
+            })
+        # if no score derived from raw scores is requested (i.e., only missing items)
+        if { "raw", "corrected_raw", "mean" }.isdisjoint(scores):
+            # return results
+            return results
+        # compute raw scores
+        with PROFILER.stage("scorer.raw", len(answers)):
+            # compute straight answers as floats (missing answers count as 0)
+            straight_answers = np.where(missing_mask, 0.0, answers)
+            # compute reversed answers (missing answers count as 0)
+            reversed_answers = np.abs(straight_answers - self.compiled_specs.reversal_offset, out=np.empty_like(straight_answers))
+            reversed_answers[missing_mask] = 0
+            # compute raw scores components
+            raw_straight = straight_answers @ self.straight
+            raw_reversed = reversed_answers @ self.reversed
+        # add raw scores to results
+        results.update({
+            "raw_straight": raw_straight,
+            "raw_reversed": raw_reversed,
+            "raw": raw_straight + raw_reversed,
+        })
+        # if neither corrected raw nor mean scores are requested
+        if { "corrected_raw", "mean" }.isdisjoint(scores):
+            # return results
+            return results
+        # intercept numpy errors, while computing corrected raw and mean scores
+        with np.errstate(divide="ignore", invalid="ignore"), PROFILER.stage("scorer.corrected_and_mean", len(answers)):
+            # compute how many items where effectively responded (by scale)
+            answered_straight = self.count_straight - results["missing_straight"]
+            answered_reversed = self.count_reversed - results["missing_reversed"]
+            # init corrected raw scores
+            corrected_raw = np.zeros_like(raw_straight)
+            # compute corrected raw scores (i.e., take into account missing items)
+            for raw_component, answered_component, count_component in [
+                (raw_straight, answered_straight, self.count_straight),
+                (raw_reversed, answered_reversed, self.count_reversed)
+            ]:
+                # compute mean responses, replacing NaNs, Infs with 0
+                mean_component = np.nan_to_num(raw_component / answered_component, nan=0, posinf=0, neginf=0)
+                # add corrected component
+                corrected_raw += mean_component * count_component
+            # compute mean scores, replacing NaNs, Infs with NaN
+            mean = np.nan_to_num(results["raw"] / (answered_straight + answered_reversed), nan=np.nan, posinf=np.nan, neginf=np.nan)
+        # return results
+        return {
+            **results,
+            "corrected_raw": corrected_raw.astype(int),
+            "mean": np.round(mean, 2),
+        }
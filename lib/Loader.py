@@ -1,15 +1,44 @@
 import json
+import numpy as np
 import pandas as pd
-from functools import reduce
+from functools import reduce, cached_property
 
-from typing import Any
-from lib.Filer import Filer
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Iterator
+from lib.Filer import Filer, DATA_FORMATS
 from lib.Errors import NotFoundError
+from lib.Compiler import CompiledSpecs, SpecsCompiler
+from lib.Profiler import PROFILER
+
+if TYPE_CHECKING:
+    from lib.Store import ResponseStore
 
 class TestSpecs():
 
-    def __init__(self, data: dict) -> None:
+    def __init__(self, data: dict, filepath: Path | None = None) -> None:
         self.data = data
+        self.filepath = filepath
+
+    @cached_property
+    def compiled(self) -> CompiledSpecs:
+        # get compiled specifications (rebuilt only when specifications change)
+        return SpecsCompiler().compile(self.data, self.filepath)
+
+    @cached_property
+    def answers_dtype(self) -> str:
+        # get likert range
+        likert_min, likert_max = self.get_spec("likert.min"), self.get_spec("likert.max")
+        # return smallest nullable integer dtype that can hold any answer (i.e., Int8 for common likert scales)
+        return next(dtype for dtype in [ "Int8", "UInt8", "Int16", "Int32", "Int64" ] if np.iinfo(dtype.lower()).min <= likert_min and likert_max <= np.iinfo(dtype.lower()).max)
+
+    @cached_property
+    def item_labels(self) -> list[str]:
+        # return labels of item answers columns (i.e., i1, i2, ..., iN)
+        return [ f"i{item + 1}" for item in range(self.get_spec("length")) ]
+
+    def get_dtypes(self, columns: pd.Index) -> dict[str, str]:
+        # return dtypes plan of test data (norms ids are categorical, item answers use compact nullable integers)
+        return { column: "category" if column == "norms_id" else self.answers_dtype for column in columns }
 
     def get_spec(self, path: str) -> Any:
         # split json path
@@ -22,6 +51,7 @@ class Loader(object):
     def __init__(self, filer: Filer) -> None:
         self.filer = filer
 
+    @PROFILER.profile("load_test_specifications_and_norms")
     def load_test_specifications_and_norms(self, test: str) -> tuple[TestSpecs, pd.DataFrame]:
         # determine test foldepath
         test_folderpath = self.filer.get_test_folderpath(test)
@@ -36,7 +66,7 @@ class Loader(object):
                 # load test specifications into json object
                 test_specs_json = json.load(fin)
         # init TestSpecs
-        test_specs = TestSpecs(test_specs_json)
+        test_specs = TestSpecs(test_specs_json, test_specs_filepath if test_specs_filepath.exists() else None)
         # get all norms
         norms_filepath = test_folderpath / f"{test}_norms.csv"
         # init norms
@@ -48,7 +78,78 @@ class Loader(object):
         # return test specifcations and norms
         return test_specs, test_all_norms
 
-    def load_test_data(self, data_filename: str) -> pd.DataFrame:
+    def apply_dtypes(self, data: pd.DataFrame, test_specs: TestSpecs | None) -> pd.DataFrame:
+        # if there are no test specifications, keep inferred dtypes
+        if test_specs is None or data.empty:
+            return data
+        # get dtypes plan
+        dtypes = test_specs.get_dtypes(data.columns)
+        # get answers dtype bounds
+        answers_dtype_info = np.iinfo(test_specs.answers_dtype.lower())
+        # get numeric columns to be converted to answers dtype (non-numeric ones are left to the sanitizer)
+        numeric_columns = [ column for column, dtype in dtypes.items() if dtype != "category" and pd.api.types.is_numeric_dtype(data[column]) ]
+        # get numeric answers
+        answers = data.loc[:, numeric_columns].to_numpy(dtype=np.float64, na_value=np.nan)
+        # determine which columns can be safely converted (i.e., integer answers within dtype bounds)
+        with np.errstate(invalid="ignore"):
+            convertible = (np.isnan(answers) | ((answers == np.floor(answers)) & (answers >= answers_dtype_info.min) & (answers <= answers_dtype_info.max))).all(axis=0)
+        # get convertible columns and their answers
+        convertible_columns, convertible_answers = [ column for column, is_convertible in zip(numeric_columns, convertible) if is_convertible ], answers[:, convertible]
+        # convert answers to answers dtype (missing answers are masked)
+        missing = np.asfortranarray(np.isnan(convertible_answers))
+        integer_answers = np.where(missing, 0, convertible_answers).astype(test_specs.answers_dtype.lower(), order="F")
+        converted_columns: dict[str, Any] = { column: pd.arrays.IntegerArray(integer_answers[:, i], missing[:, i]) for i, column in enumerate(convertible_columns) }
+        # convert norms ids to categorical
+        converted_columns.update({ column: data[column].astype("category") for column, dtype in dtypes.items() if dtype == "category" })
+        # return data with compact dtypes (columns that can't be converted keep inferred dtypes)
+        return pd.DataFrame({ column: converted_columns.get(column, data[column]) for column in data.columns }, index=data.index, copy=False)
+
+    def read_data(self, data_filepath: Path, test_specs: TestSpecs | None = None) -> pd.DataFrame:
+        # if data is stored as parquet
+        if data_filepath.suffix == DATA_FORMATS["parquet"]:
+            # read parquet file
+            return self.apply_dtypes(pd.read_parquet(data_filepath), test_specs)
+        # if data is stored as arrow ipc (feather)
+        if data_filepath.suffix in [ DATA_FORMATS["feather"], ".arrow" ]:
+            # read feather file
+            return self.apply_dtypes(pd.read_feather(data_filepath), test_specs)
+        # otherwise read csv file (norms ids are parsed as categorical right away, while item answers are
+        # narrowed after parsing, since the csv parser silently wraps values that overflow small integer dtypes)
+        return self.apply_dtypes(pd.read_csv(data_filepath, dtype={ "norms_id": "category" } if test_specs else None), test_specs)
+
+    def read_data_in_chunks(self, data_filepath: Path, chunksize: int, test_specs: TestSpecs | None = None) -> Iterator[pd.DataFrame]:
+        # if data is stored as csv
+        if data_filepath.suffix not in [ DATA_FORMATS["parquet"], DATA_FORMATS["feather"], ".arrow" ]:
+            # read csv file in chunks (index keeps counting across chunks)
+            with pd.read_csv(data_filepath, chunksize=chunksize, dtype={ "norms_id": "category" } if test_specs else None) as chunks:
+                for chunk in chunks:
+                    yield self.apply_dtypes(chunk, test_specs)
+            # stop
+            return
+        # import pyarrow (optional dependency, only needed for columnar formats)
+        import pyarrow as pa
+        import pyarrow.ipc as ipc
+        import pyarrow.parquet as pq
+        # init index of first row of current chunk
+        offset = 0
+        # if data is stored as parquet, iterate over record batches
+        if data_filepath.suffix == DATA_FORMATS["parquet"]:
+            batches = pq.ParquetFile(data_filepath).iter_batches(batch_size=chunksize)
+        # if data is stored as arrow ipc, memory map it and iterate over slices
+        else:
+            table = ipc.open_file(pa.memory_map(str(data_filepath))).read_all()
+            batches = ( table.slice(start, chunksize) for start in range(0, table.num_rows, chunksize) )
+        # iterate over batches
+        for batch in batches:
+            # convert batch to dataframe, keeping index counting across chunks
+            chunk = batch.to_pandas().set_axis(pd.RangeIndex(offset, offset + batch.num_rows))
+            # update offset
+            offset += batch.num_rows
+            # yield chunk
+            yield self.apply_dtypes(chunk, test_specs)
+
+    @PROFILER.profile("load_test_data", rows=len)
+    def load_test_data(self, data_filename: str, test_specs: TestSpecs | None = None) -> pd.DataFrame:
         # determine data filepath
         data_filepath = self.filer.get_base_folderpath("data") / data_filename
         # init test data variable
@@ -56,6 +157,40 @@ class Loader(object):
         # if test data filepath exists
         if data_filepath.exists():
             # load test data
-            data = pd.read_csv(data_filepath)
+            data = self.read_data(data_filepath, test_specs)
         # return test data
         return data
+
+    def load_test_store(self, store_filename: str) -> "ResponseStore":
+        # import response store (imported lazily, since it depends on the sanitizer)
+        from lib.Store import ResponseStore
+        # open store (answers are memory mapped, not loaded)
+        with PROFILER.stage("load_test_store") as stage:
+            store = ResponseStore(self.filer.get_base_folderpath("data") / store_filename)
+            stage.rows = store.rows
+        # return store
+        return store
+
+    def load_test_data_in_chunks(self, data_filename: str, chunksize: int, test_specs: TestSpecs | None = None) -> Iterator[pd.DataFrame]:
+        # determine data filepath
+        data_filepath = self.filer.get_base_folderpath("data") / data_filename
+        # if test data filepath doesn't exist
+        if not data_filepath.exists():
+            # yield empty test data
+            yield pd.DataFrame()
+            # stop
+            return
+        # init chunks of test data
+        chunks = self.read_data_in_chunks(data_filepath, chunksize, test_specs)
+        # iterate over chunks
+        while True:
+            # read next chunk
+            with PROFILER.stage("load_test_data") as stage:
+                chunk = next(chunks, None)
+                stage.rows, stage.skip = (len(chunk), False) if chunk is not None else (0, True)
+            # if there are no more chunks
+            if chunk is None:
+                # stop
+                return
+            # yield chunk
+            yield chunk
@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+
+from typing import Any, Iterator
+from functools import cached_property
+from lib.Loader import Loader
+from lib.Sanitizer import Sanitizer, QualityReport
+from lib.Store import ResponseStore
+from lib.Scorer import Scorer, ScoreOutputs
+from lib.Summary import SummaryReport
+from lib.Compiler import CompiledNorms, NormsCompiler
+
+class Pipeline():
+
+    def __init__(self, loader: Loader, test: str) -> None:
+        self.loader = loader
+        self.test = test
+        # load test assets once
+        self.test_specs, self.test_all_norms = loader.load_test_specifications_and_norms(test)
+        # init data-quality report (accumulated over sanitized data)
+        self.quality_report = QualityReport()
+        # init summary report (accumulated over scored data, if requested)
+        self.summary_report = SummaryReport()
+
+    @cached_property
+    def compiled_norms(self) -> CompiledNorms:
+        return NormsCompiler().compile(self.test_specs.compiled, self.test_all_norms)
+
+    def get_quality_report(self) -> dict[str, Any]:
+        # return data-quality report accumulated over sanitized data
+        return self.quality_report.to_dict()
+
+    def get_summary_report(self) -> dict[str, Any]:
+        # return summary report accumulated over scored data
+        return self.summary_report.to_dict()
+
+    def sanitize(self, test_data: pd.DataFrame) -> pd.DataFrame:
+        # init sanitizer
+        sanitizer = Sanitizer(self.test_specs, test_data)
+        # sanitize data
+        sanitized_test_data = sanitizer.sanitize()
+        # accumulate data-quality report
+        self.quality_report.add(sanitizer.quality_report)
+        # return sanitized data
+        return sanitized_test_data
+
+    def score_sanitized(self, sanitized_test_data: pd.DataFrame, expand_norms: bool = False, masked_answers: tuple[np.ndarray, np.ndarray] | None = None, outputs: ScoreOutputs | None = None) -> pd.DataFrame:
+        # score data (norms are resolved row by row, according to norms_id)
+        # standard scores are returned as flat typed columns if they should be expanded
+        # only requested blocks and scales are computed (everything, unless otherwise requested)
+        scorer = Scorer(self.test_specs, self.test_all_norms, sanitized_test_data, masked_answers, outputs, self.compiled_norms)
+        test_results = scorer.score(flat_norms=expand_norms)
+        # if scored data should be summarized
+        if outputs and outputs.summary:
+            # accumulate summary report
+            self.summary_report.add(scorer.summarize())
+        # return scored data
+        return test_results
+
+    def score(self, test_data: pd.DataFrame, expand_norms: bool = False, outputs: ScoreOutputs | None = None) -> pd.DataFrame:
+        # return scored data
+        return self.score_sanitized(self.sanitize(test_data), expand_norms, outputs=outputs)
+
+    def stream(self, data_filename: str, chunksize: int, expand_norms: bool = False, outputs: ScoreOutputs | None = None) -> Iterator[pd.DataFrame]:
+        # iterate over chunks of test data
+        for test_data in self.loader.load_test_data_in_chunks(data_filename, chunksize, self.test_specs):
+            # yield scored chunk (original row order is preserved)
+            yield self.score(test_data, expand_norms, outputs)
+
+    def score_store_rows(self, store: ResponseStore, start: int, stop: int, expand_norms: bool = False, outputs: ScoreOutputs | None = None) -> pd.DataFrame:
+        # get rows of store (already sanitized), without copying answers
+        sanitized_test_data, masked_answers = store.get_rows(start, stop)
+        # return scored rows
+        return self.score_sanitized(sanitized_test_data, expand_norms, masked_answers, outputs)
+
+    def score_store(self, store: ResponseStore, chunksize: int = 0, expand_norms: bool = False, outputs: ScoreOutputs | None = None) -> Iterator[pd.DataFrame]:
+        # make sure store matches test specifications
+        store.check(self.test_specs)
+        # iterate over chunks of store
+        for start, stop in store.iter_rows(chunksize):
+            # yield scored chunk
+            yield self.score_store_rows(store, start, stop, expand_norms, outputs)
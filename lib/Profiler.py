@@ -0,0 +1,169 @@
+import sys
+import json
+import time
+
+from pathlib import Path
+from typing import Any, Callable, Iterator
+from functools import wraps
+from contextlib import contextmanager
+
+try:
+    # import resource (unix only)
+    import resource
+except ImportError:
+    # peak memory is not measured elsewhere (e.g., on windows)
+    resource = None
+
+def get_peak_rss_mb() -> float | None:
+    # if peak memory can't be measured on this platform
+    if resource is None:
+        return None
+    # get peak resident set size of current process (linux reports KiB, macOS bytes)
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # return peak rss in MiB
+    return peak_rss / (1024 ** 2 if sys.platform == "darwin" else 1024)
+
+def get_max_rss_mb(peak_rss_mb: float | None, other_peak_rss_mb: float | None) -> float | None:
+    # get measured peaks (unmeasured peaks are None)
+    measured_peaks = [ peak for peak in (peak_rss_mb, other_peak_rss_mb) if peak is not None ]
+    # return the highest one, if any
+    return max(measured_peaks) if measured_peaks else None
+
+class Stage():
+
+    def __init__(self, name: str, rows: int | None = None) -> None:
+        self.name = name
+        # rows processed by the stage (can be set while the stage runs)
+        self.rows = rows
+        self.seconds = 0.0
+        self.peak_rss_mb: float | None = None
+        # whether the stage should not be recorded (e.g., an exhausted read)
+        self.skip = False
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "stage": self.name,
+            "seconds": self.seconds,
+            "rows": self.rows,
+            "rows_per_second": self.rows / self.seconds if self.rows and self.seconds else None,
+            "peak_rss_mb": self.peak_rss_mb,
+        }
+
+class Profiler():
+
+    def __init__(self) -> None:
+        self.enabled = False
+        # callbacks notified each time a stage completes (e.g., to export metrics)
+        self.hooks: list[Callable[[dict[str, Any]], None]] = []
+        # stage totals, in order of first appearance
+        self.totals: dict[str, dict[str, Any]] = {}
+
+    def enable(self) -> None:
+        self.enabled = True
+
+    def disable(self) -> None:
+        self.enabled = False
+
+    def reset(self) -> None:
+        self.totals = {}
+
+    def add_hook(self, hook: Callable[[dict[str, Any]], None]) -> None:
+        # register hook and start profiling
+        self.hooks.append(hook)
+        self.enable()
+
+    @contextmanager
+    def stage(self, name: str, rows: int | None = None) -> Iterator[Stage]:
+        # init stage
+        stage = Stage(name, rows)
+        # if profiling is disabled
+        if not self.enabled:
+            # run stage without measuring it
+            yield stage
+            # stop
+            return
+        # run stage
+        start = time.perf_counter()
+        yield stage
+        # measure stage
+        stage.seconds = time.perf_counter() - start
+        stage.peak_rss_mb = get_peak_rss_mb()
+        # record stage, unless it should be skipped
+        if not stage.skip:
+            self.record(stage)
+
+    def profile(self, name: str, rows: Callable[[Any], int] | None = None) -> Callable:
+        # decorate a function, so that each call is recorded as a stage
+        def decorator(fn: Callable) -> Callable:
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                # run function as a stage
+                with self.stage(name) as stage:
+                    output = fn(*args, **kwargs)
+                    # count processed rows from output, if requested
+                    stage.rows = rows(output) if rows and self.enabled else None
+                # return output
+                return output
+            # return decorated function
+            return wrapper
+        # return decorator
+        return decorator
+
+    def record(self, stage: Stage) -> None:
+        # get stage totals
+        totals = self.totals.setdefault(stage.name, { "stage": stage.name, "calls": 0, "seconds": 0.0, "rows": 0, "peak_rss_mb": None })
+        # update stage totals
+        totals["calls"] += 1
+        totals["seconds"] += stage.seconds
+        totals["rows"] += stage.rows or 0
+        totals["peak_rss_mb"] = get_max_rss_mb(totals["peak_rss_mb"], stage.peak_rss_mb)
+        # notify hooks
+        for hook in self.hooks:
+            hook(stage.to_dict())
+
+    def merge(self, totals: dict[str, dict[str, Any]]) -> None:
+        # iterate over stage totals recorded elsewhere (e.g., by worker processes)
+        for name, other_totals in totals.items():
+            # get stage totals
+            own_totals = self.totals.setdefault(name, { "stage": name, "calls": 0, "seconds": 0.0, "rows": 0, "peak_rss_mb": None })
+            # add stage totals
+            own_totals["calls"] += other_totals["calls"]
+            own_totals["seconds"] += other_totals["seconds"]
+            own_totals["rows"] += other_totals["rows"]
+            own_totals["peak_rss_mb"] = get_max_rss_mb(own_totals["peak_rss_mb"], other_totals["peak_rss_mb"])
+            # notify hooks (stages recorded elsewhere are reported once per merge, with the totals of all their calls)
+            for hook in self.hooks:
+                hook({
+                    "stage": name,
+                    "seconds": other_totals["seconds"],
+                    "rows": other_totals["rows"],
+                    "rows_per_second": other_totals["rows"] / other_totals["seconds"] if other_totals["rows"] and other_totals["seconds"] else None,
+                    "peak_rss_mb": other_totals["peak_rss_mb"],
+                    "calls": other_totals["calls"],
+                })
+
+    def summary(self) -> list[dict[str, Any]]:
+        # return stage totals, adding throughput
+        return [
+            { **totals, "rows_per_second": totals["rows"] / totals["seconds"] if totals["rows"] and totals["seconds"] else None }
+                for totals in self.totals.values()
+        ]
+
+    def format_summary(self) -> str:
+        # init lines with header
+        lines = [ f"{'stage':<36}{'calls':>7}{'seconds':>11}{'rows':>12}{'rows/sec':>14}{'peak rss MB':>13}" ]
+        # add one line per stage
+        for totals in self.summary():
+            rows_per_second = f"{totals['rows_per_second']:.0f}" if totals["rows_per_second"] else "-"
+            peak_rss_mb = f"{totals['peak_rss_mb']:.1f}" if totals["peak_rss_mb"] is not None else "-"
+            lines.append(f"{totals['stage']:<36}{totals['calls']:>7}{totals['seconds']:>11.4f}{totals['rows']:>12}{rows_per_second:>14}{peak_rss_mb:>13}")
+        # return summary
+        return "\n".join(lines)
+
+    def save(self, filepath: Path) -> None:
+        # store summary as json
+        with filepath.open("w") as fout:
+            json.dump({ "stages": self.summary(), "peak_rss_mb": get_peak_rss_mb() }, fout, indent=2)
+
+# process-wide profiler used by instrumented stages
+PROFILER = Profiler()
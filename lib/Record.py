@@ -0,0 +1,157 @@
+import math
+
+from typing import Any, Sequence
+from lib.Filer import Filer
+from lib.Loader import Loader
+from lib.Compiler import CompiledSpecs, CompiledNorms, NormsCompiler
+from lib.Sanitizer import UNAVAILABLE_NORMS
+
+class RecordScorer():
+
+    def __init__(self, compiled_specs: CompiledSpecs, compiled_norms: CompiledNorms) -> None:
+        # store test metadata
+        self.length = compiled_specs.length
+        self.item_labels = tuple(f"i{item + 1}" for item in range(self.length))
+        self.scales = tuple(compiled_specs.scales)
+        self.available_norms = frozenset(compiled_specs.norms)
+        self.likert_min = compiled_specs.likert_min
+        self.likert_max = compiled_specs.likert_max
+        self.reversal_offset = compiled_specs.reversal_offset
+        # store straight/reversed item indices by scale, as plain tuples
+        self.straight_items = tuple(tuple(compiled_specs.straight[:, s].nonzero()[0].tolist()) for s in range(len(self.scales)))
+        self.reversed_items = tuple(tuple(compiled_specs.reversed[:, s].nonzero()[0].tolist()) for s in range(len(self.scales)))
+        # store number of straight/reversed items by scale, as floats (like the scoring kernel)
+        self.count_straight = tuple(float(len(items)) for items in self.straight_items)
+        self.count_reversed = tuple(float(len(items)) for items in self.reversed_items)
+        # store compiled norms
+        self.compiled_norms = compiled_norms
+        self.raw_min = compiled_norms.raw_min
+        # store decoded lookup tables as nested lists (field -> norms -> scale -> raw)
+        self.tables = { field: self.decode_table(compiled_norms, field) for field in compiled_norms.fields }
+        # store labels of standard scores, in the same order of Scorer flat columns
+        self.norms_labels = tuple(
+            (f"std_{scale}_{norms_id}_{field}", scale_index, norms_index, field)
+                for scale_index, scale in enumerate(self.scales)
+                for norms_index, norms_id in enumerate(compiled_norms.norms_ids)
+                for field in compiled_norms.fields
+        )
+
+    def decode_table(self, compiled_norms: CompiledNorms, field: str) -> list:
+        # get lookup table of field
+        table = compiled_norms.tables[field]
+        # if field is categorical
+        if field in compiled_norms.categories:
+            # map codes to categories (code -1 marks missing values)
+            categories = compiled_norms.categories[field] + [ None ]
+            return [ [ [ categories[code] for code in row ] for row in by_scale ] for by_scale in table.tolist() ]
+        # if field only holds integers
+        if field in compiled_norms.integer_fields:
+            # convert values to ints (NaN marks missing values)
+            return [ [ [ int(value) if value == value else None for value in row ] for row in by_scale ] for by_scale in table.tolist() ]
+        # otherwise convert NaNs to None
+        return [ [ [ value if value == value else None for value in row ] for row in by_scale ] for by_scale in table.tolist() ]
+
+    def sanitize_answer(self, answer: Any) -> float | None:
+        try:
+            # coerce answer to number
+            value = float(answer)
+        # on error (i.e., answer is not numeric)
+        except (TypeError, ValueError):
+            # answer is missing
+            return None
+        # if answer is NaN
+        if value != value:
+            # answer is missing
+            return None
+        # if answer is not an integer (infinite answers are clipped, as numbers beyond the likert range)
+        if math.isfinite(value) and not value.is_integer():
+            # raise error (likert answers are integers)
+            raise ValueError(f"Answers should be integers, got {answer!r}.")
+        # return answer clipped to likert range
+        return float(min(max(value, self.likert_min), self.likert_max))
+
+    def sanitize_norms(self, norms_ids: str | Sequence[str] | None) -> str:
+        # join norms ids if they are given as a sequence
+        norms_ids = " ".join(norms_ids) if isinstance(norms_ids, (list, tuple)) else norms_ids
+        # if norms ids are not a string
+        if not isinstance(norms_ids, str):
+            # norms are unavailable
+            return UNAVAILABLE_NORMS
+        # return norms ids if all of them are available, otherwise UNAVAILABLE_NORMS
+        return norms_ids if set(norms_ids.split(" ")).issubset(self.available_norms) else UNAVAILABLE_NORMS
+
+    def score(self, answers: Sequence[Any] | dict[str, Any], norms_ids: str | Sequence[str] | None = UNAVAILABLE_NORMS) -> dict[str, Any]:
+        # if answers are given by item label
+        if isinstance(answers, dict):
+            # if some item labels are unknown or missing
+            if answers.keys() != set(self.item_labels):
+                # raise error
+                raise ValueError(f"Unknown items {sorted(answers.keys() - set(self.item_labels))} and missing items {sorted(set(self.item_labels) - answers.keys())}.")
+            # get answers in the order of item labels
+            answers = [ answers[label] for label in self.item_labels ]
+        # get answers as a list
+        answers = list(answers)
+        # if answers don't match test length
+        if len(answers) != self.length:
+            # raise error
+            raise ValueError(f"Expected {self.length} answers, got {len(answers)}.")
+        # sanitize norms and answers
+        norms_ids = self.sanitize_norms(norms_ids)
+        values = [ self.sanitize_answer(answer) for answer in answers ]
+        # init result
+        result: dict[str, Any] = { "norms_id": norms_ids }
+        # echo sanitized answers (integers are returned as ints)
+        result.update({ label: int(value) if value is not None else None for label, value in zip(self.item_labels, values) })
+        # init scores
+        missing, raw, corrected_raw, mean = [], [], [], []
+        # iterate over scales
+        for straight_items, reversed_items, count_straight, count_reversed in zip(self.straight_items, self.reversed_items, self.count_straight, self.count_reversed):
+            # get straight/reversed answers of current scale
+            straight_values = [ values[i] for i in straight_items if values[i] is not None ]
+            reversed_values = [ abs(values[i] - self.reversal_offset) for i in reversed_items if values[i] is not None ] # type: ignore
+            # compute how many items were effectively responded
+            answered_straight, answered_reversed = float(len(straight_values)), float(len(reversed_values))
+            # compute raw scores components
+            raw_straight, raw_reversed = float(sum(straight_values)), float(sum(reversed_values))
+            # compute corrected raw score (mean responses are 0 when no items were responded)
+            mean_straight = raw_straight / answered_straight if answered_straight else 0.0
+            mean_reversed = raw_reversed / answered_reversed if answered_reversed else 0.0
+            corrected_raw.append(int(0.0 + mean_straight * count_straight + mean_reversed * count_reversed))
+            # compute missing items and raw score
+            missing.append(int(count_straight - answered_straight + count_reversed - answered_reversed))
+            raw.append(raw_straight + raw_reversed)
+            # compute mean score, rounded as numpy does (None when no items were responded)
+            answered = answered_straight + answered_reversed
+            mean.append(round((raw_straight + raw_reversed) / answered * 100) / 100 if answered else None)
+        # store scores
+        for prefix, scores in [ ("missing_", missing), ("raw_", raw), ("corrected_raw_", corrected_raw), ("mean_", mean) ]:
+            result.update({ f"{prefix}{scale}": score for scale, score in zip(self.scales, scores) })
+        # get requested norms
+        norms_indices = set(self.compiled_norms.get_norms_indices(norms_ids))
+        # determine raw cells of lookup tables (raw scores falling outside norms get the boundary)
+        last_cell = len(self.tables[self.compiled_norms.fields[0]][0][0]) - 1 if self.norms_labels else 0
+        raw_cells = [ min(max(score - self.raw_min, 0), last_cell) for score in corrected_raw ]
+        # store standard scores (None when norms were not requested)
+        result.update({
+            label: self.tables[field][norms_index][scale_index][raw_cells[scale_index]] if norms_index in norms_indices else None
+                for label, scale_index, norms_index, field in self.norms_labels
+        })
+        # return result
+        return result
+
+# record scorers by test (built once per process)
+record_scorers: dict[str, RecordScorer] = {}
+
+def get_record_scorer(test: str) -> RecordScorer:
+    # if test was not loaded yet
+    if test not in record_scorers:
+        # load test assets
+        test_specs, test_all_norms = Loader(Filer()).load_test_specifications_and_norms(test)
+        # build record scorer from compiled specs and norms
+        record_scorers[test] = RecordScorer(test_specs.compiled, NormsCompiler().compile(test_specs.compiled, test_all_norms))
+    # return record scorer
+    return record_scorers[test]
+
+def score_record(test: str, answers: Sequence[Any] | dict[str, Any], norms_ids: str | Sequence[str] | None = UNAVAILABLE_NORMS) -> dict[str, Any]:
+    # score a single respondent without going through pandas
+    return get_record_scorer(test).score(answers, norms_ids)
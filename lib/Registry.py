@@ -0,0 +1,120 @@
+import os
+import json
+import hashlib
+
+from pathlib import Path
+from typing import Any
+from functools import cached_property
+from lib.Filer import BASE_PATH, TESTS_PATH, save_json
+from lib.Errors import NotFoundError
+
+# name of the registry manifest, stored in the tests folder
+REGISTRY_FILENAME = ".registry.json"
+
+def hash_specs(data: dict) -> str:
+    # hash a canonical serialization, so that formatting changes do not trigger a rebuild
+    return hashlib.sha256(json.dumps(data, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+
+def hash_file(filepath: Path) -> str:
+    # return hash of file content
+    with filepath.open("rb") as fin:
+        return hashlib.sha256(fin.read()).hexdigest()
+
+class TestRegistry():
+
+    def __init__(self, tests_folderpath: Path = TESTS_PATH) -> None:
+        self.tests_folderpath = tests_folderpath
+        self.manifest_filepath = tests_folderpath / REGISTRY_FILENAME
+
+    def get_signature(self) -> dict[str, list[int]]:
+        # init signature (folder mtimes are not used, since compiled caches and the manifest itself are stored there)
+        signature = {}
+        # iterate over test folders
+        for entry in os.scandir(self.tests_folderpath):
+            # skip hidden entries and files
+            if entry.name.startswith(".") or not entry.is_dir():
+                continue
+            # add test assets (mtime and size)
+            for filepath in [ Path(entry.path) / f"{entry.name}_specs.json", Path(entry.path) / f"{entry.name}_norms.csv" ]:
+                try:
+                    stat = filepath.stat()
+                    signature[str(filepath.relative_to(self.tests_folderpath))] = [ stat.st_mtime_ns, stat.st_size ]
+                # on error (i.e., asset is missing)
+                except OSError:
+                    pass
+        # return signature
+        return signature
+
+    def build_entry(self, test_folderpath: Path) -> dict[str, Any]:
+        # determine test assets
+        specs_filepath = test_folderpath / f"{test_folderpath.name}_specs.json"
+        norms_filepath = test_folderpath / f"{test_folderpath.name}_norms.csv"
+        # load test specifications
+        with specs_filepath.open() as fin:
+            specs = json.load(fin)
+        # return registry entry
+        return {
+            "test": test_folderpath.name,
+            "path": str(test_folderpath.relative_to(BASE_PATH)) if test_folderpath.is_relative_to(BASE_PATH) else str(test_folderpath),
+            "specs_hash": hash_specs(specs),
+            "length": specs.get("length"),
+            "likert": specs.get("likert"),
+            "scales": [ scale[0] for scale in specs.get("scales", []) ],
+            "norms": {
+                "ids": specs.get("norms", []),
+                "filename": norms_filepath.name if norms_filepath.exists() else None,
+                "hash": hash_file(norms_filepath) if norms_filepath.exists() else None,
+            },
+        }
+
+    def build(self, signature: dict[str, list[int]]) -> dict[str, Any]:
+        # init tests
+        tests = {}
+        # iterate over test folders holding test specifications
+        for test_folderpath in sorted(self.tests_folderpath.glob("[!.]*")):
+            if test_folderpath.is_dir() and (test_folderpath / f"{test_folderpath.name}_specs.json").exists():
+                # add test entry
+                tests[test_folderpath.name] = self.build_entry(test_folderpath)
+        # return manifest
+        return { "signature": signature, "tests": tests }
+
+    def save(self, manifest: dict[str, Any]) -> None:
+        # write atomically, so that concurrent readers never see a partial manifest
+        save_json(manifest, self.manifest_filepath)
+
+    @cached_property
+    def manifest(self) -> dict[str, Any]:
+        # get current signature of tests folder
+        signature = self.get_signature()
+        try:
+            # load stored manifest
+            with self.manifest_filepath.open() as fin:
+                manifest = json.load(fin)
+            # if tests folder didn't change, return stored manifest
+            if manifest.get("signature") == signature:
+                return manifest
+        # on error (i.e., manifest is missing or corrupted), rebuild it
+        except (OSError, ValueError):
+            pass
+        # rebuild manifest
+        manifest = self.build(signature)
+        try:
+            # store manifest
+            self.save(manifest)
+        # on error (i.e., read-only folder), keep manifest in memory only
+        except OSError:
+            pass
+        # return manifest
+        return manifest
+
+    def get_tests(self) -> list[str]:
+        # return available tests
+        return list(self.manifest["tests"].keys())
+
+    def get_test(self, test: str) -> dict[str, Any]:
+        # if test is not available
+        if test not in self.manifest["tests"]:
+            # raise error
+            raise NotFoundError(f"'{test}' is not an available test.")
+        # return registry entry
+        return self.manifest["tests"][test]
@@ -0,0 +1,174 @@
+import json
+import hashlib
+import numpy as np
+import pandas as pd
+
+from pathlib import Path
+from typing import Any
+from lib.Pipeline import Pipeline
+from lib.Dispatcher import Dispatcher
+from lib.Writer import Writer
+from lib.Filer import open_atomic
+from lib.Compiler import NormsCompiler
+from lib.Scorer import ScoreOutputs
+from lib.Profiler import PROFILER
+
+# suffix of the sidecar index of row fingerprints, stored next to scored data
+INDEX_SUFFIX = ".index.npz"
+
+class Rescorer():
+
+    def __init__(self, pipeline: Pipeline, test_results_filepath: Path, data_format: str = "csv", expand_norms: bool = False, outputs: ScoreOutputs | None = None) -> None:
+        self.pipeline = pipeline
+        self.test_results_filepath = test_results_filepath
+        self.data_format = data_format
+        self.expand_norms = expand_norms
+        self.outputs = outputs or ScoreOutputs()
+        # determine sidecar index filepath (e.g., xerox/data_demo_scored.csv.index.npz)
+        self.index_filepath = test_results_filepath.with_name(f"{test_results_filepath.name}{INDEX_SUFFIX}")
+
+    def get_norms_hashes(self) -> dict[str, str]:
+        # get norms of test
+        test_all_norms = self.pipeline.test_all_norms
+        # if norms are missing
+        if "norms_id" not in test_all_norms.columns:
+            return {}
+        # return hash of each norms id (so that editing one norms invalidates only rows using it)
+        return { str(norms_id): NormsCompiler.hash_norms(norms) for norms_id, norms in test_all_norms.groupby("norms_id", sort=False) }
+
+    def get_versions(self, norms_ids: pd.Series) -> np.ndarray:
+        # get specifications hash and norms hashes
+        specs_hash, norms_hashes = self.pipeline.test_specs.compiled.hash, self.get_norms_hashes()
+        # get distinct combinations of norms ids (missing norms ids are coded as -1)
+        codes, combinations = pd.factorize(norms_ids)
+        # hash each combination once, together with specifications (last slot is used by missing norms ids)
+        versions = np.array([
+            int.from_bytes(hashlib.sha256("|".join([ specs_hash ] + [ norms_hashes.get(norms_id, "") for norms_id in str(c).split(" ") ]).encode()).digest()[:8], "little")
+                for c in combinations
+        ] + [ int.from_bytes(hashlib.sha256(specs_hash.encode()).digest()[:8], "little") ], dtype=np.uint64)
+        # broadcast versions to rows
+        return versions[codes]
+
+    def fingerprint(self, test_data: pd.DataFrame) -> np.ndarray:
+        # get norms ids (rows without norms_id share the same version)
+        norms_ids = pd.Series(test_data["norms_id"] if "norms_id" in test_data.columns else pd.Series(np.nan, index=test_data.index))
+        # get answers as floats, whatever dtypes were inferred (values that can't be parsed become NaN), so that one bad cell doesn't change every row
+        answers = test_data.drop(columns=["norms_id"], errors="ignore")
+        fingerprint_data = pd.DataFrame({
+            i: pd.Series(pd.to_numeric(answers.iloc[:, i], errors="coerce")).to_numpy(dtype=np.float64, na_value=np.nan) for i in range(answers.shape[1])
+        }, index=test_data.index)
+        # add norms ids as strings and the version of specifications and requested norms
+        fingerprint_data["norms_id"] = norms_ids.astype(str).to_numpy()
+        fingerprint_data["version"] = self.get_versions(norms_ids)
+        # return hashes of rows
+        return pd.util.hash_pandas_object(fingerprint_data, index=False).to_numpy() # type: ignore
+
+    def get_meta(self, test_data: pd.DataFrame) -> dict[str, Any]:
+        # return settings that determine the layout of scored data
+        return {
+            "test": self.pipeline.test,
+            "data_format": self.data_format,
+            "expand_norms": self.expand_norms,
+            "outputs": self.outputs.to_dict(),
+            "columns": list(map(str, test_data.columns)),
+        }
+
+    def load_index(self, meta: dict[str, Any]) -> np.ndarray | None:
+        # if scored data or sidecar index are missing
+        if not self.test_results_filepath.exists() or not self.index_filepath.exists():
+            return None
+        try:
+            # load sidecar index (no pickled objects allowed)
+            with np.load(self.index_filepath, allow_pickle=False) as archive:
+                # if scored data were stored with a different layout, they can't be reused
+                if json.loads(str(archive["meta"])) != meta:
+                    return None
+                # return fingerprints of scored rows
+                return archive["fingerprints"]
+        # on error (i.e., corrupted index), score everything again
+        except Exception:
+            return None
+
+    def save_index(self, fingerprints: np.ndarray, meta: dict[str, Any]) -> None:
+        # atomically store fingerprints and layout (replacing previous index)
+        with open_atomic(self.index_filepath, "wb") as fout:
+            np.savez(fout, fingerprints=fingerprints, meta=np.array(json.dumps(meta)))
+
+    def match(self, fingerprints: np.ndarray, previous_fingerprints: np.ndarray) -> np.ndarray:
+        # map each previous fingerprint to its first scored row (duplicated rows share the same results)
+        previous_rows = pd.Series(np.arange(len(previous_fingerprints)), index=previous_fingerprints)
+        previous_rows = previous_rows.loc[~previous_rows.index.duplicated()]
+        # locate current fingerprints among previous ones (-1 marks new or modified rows)
+        positions = previous_rows.index.get_indexer(fingerprints)
+        # return previous row of each current row (-1 marks new or modified rows)
+        return np.where(positions >= 0, previous_rows.to_numpy()[positions], -1)
+
+    def merge_csv(self, previous_rows: np.ndarray, test_results: pd.DataFrame) -> None:
+        # read lines of previous scored data (first line is the header)
+        previous_lines = self.test_results_filepath.read_bytes().split(b"\n")
+        # format lines of newly scored rows (header and trailing newline aside)
+        new_lines = test_results.to_csv(index=False, lineterminator="\n").encode().split(b"\n")[1:-1] if len(test_results) else []
+        # gather lines of reused and newly scored rows
+        lines = np.array(previous_lines[1:-1] + new_lines, dtype=object)
+        # determine order of lines (newly scored rows follow reused ones)
+        order = np.where(previous_rows >= 0, previous_rows, 0)
+        order[previous_rows < 0] = len(previous_lines) - 2 + np.arange((previous_rows < 0).sum())
+        # store scored data
+        self.test_results_filepath.write_bytes(b"\n".join([ previous_lines[0], *lines[order] ]) + b"\n")
+
+    def merge_arrow(self, previous_rows: np.ndarray, test_results: pd.DataFrame) -> None:
+        # import pyarrow (optional dependency, only needed for columnar formats)
+        import pyarrow as pa
+        import pyarrow.feather as feather
+        import pyarrow.parquet as pq
+        # read previous scored data
+        previous_table = pq.read_table(self.test_results_filepath) if self.data_format == "parquet" else feather.read_table(str(self.test_results_filepath))
+        # convert newly scored rows to arrow, matching previous schema
+        new_tables = [ pa.Table.from_pandas(test_results, preserve_index=False).cast(previous_table.schema) ] if len(test_results) else []
+        # determine order of rows (newly scored rows follow previous ones)
+        order = previous_rows.copy()
+        order[previous_rows < 0] = previous_table.num_rows + np.arange((previous_rows < 0).sum())
+        # gather reused and newly scored rows
+        table = pa.concat_tables([ previous_table, *new_tables ]).unify_dictionaries().combine_chunks().take(pa.array(order))
+        # store scored data
+        if self.data_format == "parquet":
+            pq.write_table(table, self.test_results_filepath)
+        else:
+            feather.write_feather(table, str(self.test_results_filepath))
+
+    def rescore(self, test_data: pd.DataFrame, scoring_engine: Pipeline | Dispatcher) -> int:
+        # fingerprint rows
+        with PROFILER.stage("rescorer.fingerprint", len(test_data)):
+            fingerprints = self.fingerprint(test_data)
+        # get layout of scored data
+        meta = self.get_meta(test_data)
+        # load fingerprints of previously scored rows
+        previous_fingerprints = self.load_index(meta)
+        # if previous results can't be reused
+        if previous_fingerprints is None:
+            # score all rows
+            with Writer(self.test_results_filepath, self.data_format) as writer:
+                writer.write(scoring_engine.score(test_data, self.expand_norms, self.outputs))
+            # store sidecar index
+            self.save_index(fingerprints, meta)
+            # return number of scored rows
+            return len(test_data)
+        # if nothing changed (same rows in the same order), keep previous results
+        if np.array_equal(fingerprints, previous_fingerprints):
+            return 0
+        # match rows to previously scored ones
+        previous_rows = self.match(fingerprints, previous_fingerprints)
+        # get new or modified rows
+        changed_rows = previous_rows < 0
+        # score new or modified rows only
+        test_results = scoring_engine.score(test_data.loc[changed_rows], self.expand_norms, self.outputs) if changed_rows.any() else pd.DataFrame()
+        # merge reused and newly scored rows
+        with PROFILER.stage("write", len(test_data)):
+            if self.data_format == "csv":
+                self.merge_csv(previous_rows, test_results)
+            else:
+                self.merge_arrow(previous_rows, test_results)
+        # store sidecar index
+        self.save_index(fingerprints, meta)
+        # return number of scored rows
+        return int(changed_rows.sum())
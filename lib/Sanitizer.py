@@ -4,14 +4,43 @@ import pandas as pd
 from functools import cached_property
 from lib.Errors import ValidationError
 from lib.Loader import TestSpecs
+from lib.Profiler import PROFILER
 
 UNAVAILABLE_NORMS = "n.a."
 
+class QualityReport():
+
+    def __init__(self) -> None:
+        # init number of sanitized rows
+        self.rows = 0
+        # init counts by column (e.g., { "i1": { "coerced": 0, "clipped": 0, "missing": 0 } })
+        self.columns: dict[str, dict[str, int]] = {}
+
+    def count(self, column: str, issue: str, cells: int) -> None:
+        # add cells with issue to column counts
+        column_counts = self.columns.setdefault(column, {})
+        column_counts[issue] = column_counts.get(issue, 0) + int(cells)
+
+    def add(self, other: "QualityReport") -> "QualityReport":
+        # add rows of other report (e.g., of another chunk)
+        self.rows += other.rows
+        # add counts of other report
+        for column, column_counts in other.columns.items():
+            for issue, cells in column_counts.items():
+                self.count(column, issue, cells)
+        # return report
+        return self
+
+    def to_dict(self) -> dict:
+        return { "rows": self.rows, "columns": self.columns }
+
 class Sanitizer():
 
     def __init__(self, test_specs: TestSpecs, test_data: pd.DataFrame) -> None:
         self.test_specs = test_specs
         self.test_data = test_data
+        # init data-quality report
+        self.quality_report = QualityReport()
 
     @cached_property
     def norms(self) -> pd.DataFrame:
@@ -30,20 +59,73 @@ class Sanitizer():
     def sanitize_norms(self) -> pd.DataFrame:
         # get available norms as a set
         available_norms = set(self.test_specs.get_spec("norms"))
-        # set condition to check
-        condition = self.norms.map(lambda x: set(x.split(" ")).issubset(available_norms)).values
+        # get distinct combinations of norms ids (missing norms ids are coded as -1)
+        codes, combinations = pd.factorize(self.norms["norms_id"])
+        # validate each distinct combination once (last slot marks missing norms ids)
+        valid_combinations = np.array([ isinstance(c, str) and set(c.split(" ")).issubset(available_norms) for c in combinations ] + [ False ])
+        # broadcast verdicts to rows
+        valid_rows = valid_combinations[codes]
+        # count invalid norms
+        self.quality_report.count("norms_id", "invalid_norms", (~valid_rows).sum())
+        # determine categories (valid combinations, then UNAVAILABLE_NORMS)
+        categories = [ str(c) for c, valid in zip(combinations, valid_combinations) if valid ]
+        # map combinations codes to categories codes (invalid combinations point to UNAVAILABLE_NORMS)
+        categories_codes = np.cumsum(valid_combinations) - 1
+        categories_codes[~valid_combinations] = len(categories) if UNAVAILABLE_NORMS not in categories else categories.index(UNAVAILABLE_NORMS)
         # cleanup norms
-        self.norms = self.norms.where(condition, UNAVAILABLE_NORMS)
+        self.norms = pd.DataFrame({
+            "norms_id": pd.Categorical.from_codes(categories_codes[codes], categories=categories + ([ UNAVAILABLE_NORMS ] if UNAVAILABLE_NORMS not in categories else []))
+        }, index=self.norms.index)
         # return norms
         return self.norms
 
     def sanitize_item_answers(self) -> pd.DataFrame | pd.Series:
-        return (
-            self.item_answers
-                .apply(lambda x: pd.to_numeric(x, errors="coerce", downcast="integer"))
-                .clip(self.test_specs.get_spec("likert.min"), self.test_specs.get_spec("likert.max"))
-        )
+        # get item answers and likert range
+        item_answers = self.item_answers
+        likert_min, likert_max = self.test_specs.get_spec("likert.min"), self.test_specs.get_spec("likert.max")
+        # init answers buffer
+        answers = np.empty(item_answers.shape, dtype=np.float64)
+        # determine positions of numeric and non-numeric columns
+        numeric = np.array([ pd.api.types.is_numeric_dtype(dtype) for dtype in item_answers.dtypes ], dtype=bool)
+        # copy numeric columns as floats at once
+        if numeric.any():
+            answers[:, numeric] = item_answers.iloc[:, numeric].to_numpy(dtype=np.float64, na_value=np.nan)
+        # coerce non-numeric columns at once (values that can't be parsed become NaN)
+        if (~numeric).any():
+            raw_answers = item_answers.iloc[:, ~numeric].to_numpy(dtype=object)
+            answers[:, ~numeric] = pd.Series(pd.to_numeric(pd.Series(raw_answers.ravel()), errors="coerce")).to_numpy(dtype=np.float64, na_value=np.nan).reshape(raw_answers.shape)
+        # compute missing answers mask
+        missing = np.isnan(answers)
+        # compute non-integer answers mask
+        non_integer = ~missing & (answers != np.floor(answers))
+        # if some answers are not integers
+        if non_integer.any():
+            # raise error (likert answers are integers, and answers keep the integer dtype of the specifications whatever the chunk)
+            raise ValidationError(f"Answers should be integers, found {int(non_integer.sum())} non-integer answers in columns {[ str(column) for column in item_answers.columns[non_integer.any(axis=0)] ]}.")
+        # compute out-of-range answers mask
+        with np.errstate(invalid="ignore"):
+            out_of_range = (answers < likert_min) | (answers > likert_max)
+        # clip answers to likert range
+        np.clip(answers, likert_min, likert_max, out=answers)
+        # update data-quality report
+        for column, coerced, clipped, missing_cells in zip(
+            item_answers.columns,
+            (missing & item_answers.notna().to_numpy()).sum(axis=0),
+            out_of_range.sum(axis=0),
+            missing.sum(axis=0)
+        ):
+            self.quality_report.count(column, "coerced", coerced)
+            self.quality_report.count(column, "clipped", clipped)
+            self.quality_report.count(column, "missing", missing_cells)
+        # convert answers to the compact dtype of the specifications, column by column (missing answers are masked)
+        integer_answers = np.where(missing, 0, answers).astype(self.test_specs.answers_dtype.lower(), order="F")
+        missing = np.asfortranarray(missing)
+        # return sanitized item answers (they keep the compact dtype until output, so that every chunk shares the same schema)
+        return pd.DataFrame({
+            column: pd.arrays.IntegerArray(integer_answers[:, i], missing[:, i]) for i, column in enumerate(item_answers.columns)
+        }, index=item_answers.index, copy=False)
 
+    @PROFILER.profile("sanitize", rows=len)
     def sanitize(self) -> pd.DataFrame:
         # if test data doesn't match test specificaions
         if self.norms.shape[1] + self.item_answers.shape[1] != self.test_specs.get_spec("length") + 1:
@@ -52,5 +134,7 @@ class Sanitizer():
         # sanitize norms and item answers
         sanitized_norms = self.sanitize_norms()
         sanitized_items_answers = self.sanitize_item_answers()
+        # store number of sanitized rows
+        self.quality_report.rows = len(sanitized_norms)
         # return
         return pd.concat([ sanitized_norms, sanitized_items_answers ], axis=1)
@@ -1,22 +1,82 @@
-import re
 import numpy as np
 import pandas as pd
+from typing import Any, Iterable
 from functools import cached_property
 
 from pandas.core.generic import Axes
 from lib.Loader import TestSpecs
+from lib.Kernel import KERNEL_SCORES, ScoringKernel
+from lib.Compiler import CompiledNorms, NormsCompiler
+from lib.Summary import SummaryReport
+from lib.Errors import ValidationError
+from lib.Profiler import PROFILER
+
+# blocks of scored data, in output order (norms ids are always included)
+OUTPUT_BLOCKS = ("answers", "missing", "raw", "corrected_raw", "mean", "std")
+
+class ScoreOutputs():
+
+    def __init__(self, blocks: Iterable[str] | None = None, scales: Iterable[str] | None = None, summary: bool = False) -> None:
+        # get requested blocks (all of them, unless otherwise requested)
+        requested_blocks = set(OUTPUT_BLOCKS if blocks is None else blocks)
+        # if some blocks are not available
+        if requested_blocks - set(OUTPUT_BLOCKS):
+            # raise error
+            raise ValidationError(f"Output blocks {sorted(requested_blocks - set(OUTPUT_BLOCKS))} are not available (choose from {list(OUTPUT_BLOCKS)}).")
+        # store requested blocks, in output order
+        self.blocks = [ block for block in OUTPUT_BLOCKS if block in requested_blocks ]
+        # store requested scales (None means all scales)
+        self.scales = None if scales is None else list(scales)
+        # store whether scored data should be summarized by norms id and scale
+        self.summary = summary
+
+    def get_scale_indices(self, test_specs: TestSpecs) -> list[int] | None:
+        # if all scales are requested
+        if self.scales is None:
+            return None
+        # get scales of test
+        scales = [ scale[0] for scale in test_specs.get_spec("scales") ]
+        # if some scales are not available
+        if set(self.scales) - set(scales):
+            # raise error
+            raise ValidationError(f"Scales {sorted(set(self.scales) - set(scales))} are not available (choose from {scales}).")
+        # return indices of requested scales, in the order of test specifications
+        return [ index for index, scale in enumerate(scales) if scale in self.scales ]
+
+    def get_kernel_scores(self) -> list[str]:
+        # determine scores needed by other blocks (standard scores are looked up from corrected raw scores, summaries use missing items too)
+        needed_scores = { *([ "corrected_raw" ] if "std" in self.blocks else []), *([ "missing", "corrected_raw" ] if self.summary else []) }
+        # return scores the kernel should compute
+        return [ score for score in KERNEL_SCORES if score in self.blocks or score in needed_scores ]
+
+    def to_dict(self) -> dict[str, Any]:
+        return { "blocks": self.blocks, "scales": self.scales }
 
 class Scorer():
 
-    def __init__(self, test_specs: TestSpecs, test_norms: pd.DataFrame, test_data: pd.DataFrame) -> None:
+    def __init__(self, test_specs: TestSpecs, test_norms: pd.DataFrame, test_data: pd.DataFrame, masked_answers: tuple[np.ndarray, np.ndarray] | None = None, outputs: ScoreOutputs | None = None, compiled_norms: CompiledNorms | None = None) -> None:
         self.test_specs = test_specs
         self.test_norms = test_norms
         self.test_data = test_data
-        self.straight_items_by_scale, self.reversed_items_by_scale = self.convert_to_matrices()
+        # norms compiled from test norms (e.g., cached by a pipeline), if available
+        self._compiled_norms = compiled_norms
+        # integer answers and missing answers mask backing test data (e.g., read from a response store), if available
+        self.masked_answers = masked_answers
+        # requested blocks and scales of scored data (everything, unless otherwise requested)
+        self.outputs = outputs or ScoreOutputs()
+        self.scale_indices = self.outputs.get_scale_indices(test_specs)
+
+    @cached_property
+    def compiled_norms(self) -> CompiledNorms:
+        # return compiled norms as they are, if available, otherwise compile test norms (hashing them once per scorer)
+        return self._compiled_norms if self._compiled_norms is not None else NormsCompiler().compile(self.test_specs.compiled, self.test_norms)
 
     @cached_property
     def scales(self) -> Axes:
-        return pd.Index([ scale[0] for scale in self.test_specs.get_spec("scales") ])
+        # get all scales
+        scales = [ scale[0] for scale in self.test_specs.get_spec("scales") ]
+        # return requested scales
+        return pd.Index(scales if self.scale_indices is None else [ scales[index] for index in self.scale_indices ])
 
     @cached_property
     def norms(self) -> pd.DataFrame:
@@ -27,157 +87,186 @@ class Scorer():
         return self.test_data.drop(columns=["norms_id"])
 
     @cached_property
-    def count_items_by_scale(self) -> tuple[pd.DataFrame,pd.DataFrame]:
-        return self.straight_items_by_scale.sum(), self.reversed_items_by_scale.sum()
+    def kernel_answers(self) -> tuple[np.ndarray, np.ndarray]:
+        # if integer answers and missing answers mask are available, return them as they are
+        if self.masked_answers is not None:
+            return self.masked_answers
+        # otherwise return answers as a contiguous float buffer (NaN marks missing answers), along with missing answers mask
+        answers = self.answers.to_numpy(dtype=np.float64, na_value=np.nan)
+        return answers, np.isnan(answers)
 
     @cached_property
-    def missing_items_by_scale(self) -> tuple[pd.DataFrame | pd.Series, pd.DataFrame | pd.Series]:
-        # lambda fn
-        lambda_fn = lambda x: self.answers.T.loc[x.astype(bool).values].isna().sum()
-        # missing straight items per scale
-        sum_of_missing_straight_items_by_scale = self.straight_items_by_scale.apply(lambda_fn)
-        # missing reversed items per scale
-        sum_of_missing_reversed_items_by_scale = self.reversed_items_by_scale.apply(lambda_fn)
-        # if we want results splitted by straight/reversed items
-        return sum_of_missing_straight_items_by_scale, sum_of_missing_reversed_items_by_scale
-
-    def convert_to_matrices(self) -> tuple[pd.DataFrame, pd.DataFrame]:
-        # init matrices to be returned
-        items_by_scale = pd.DataFrame()
-        reversed_items_by_scale = pd.DataFrame()
-        # iterate over scales
-        for scale in self.test_specs.get_spec("scales"):
-            # get current scale label, straight and reversed items
-            scale_label, straight_items_indices, reversed_items_indices = scale
-            # iterate over type of items (either straight or reversed)
-            for df, items_indices in [
-                (items_by_scale, straight_items_indices),
-                (reversed_items_by_scale, reversed_items_indices)
-            ]:
-                # init items series with zeroes
-                items = pd.Series(np.zeros(self.test_specs.get_spec("length")))
-                # correct item indices, since items are 1-based while matrices are 0-based
-                matrix_indices = pd.Series(items_indices).sub(1)
-                # "switch to 1" items belonging to current scale
-                items[matrix_indices] = 1
-                # add current scale items matrix to approriate dataframe
-                df[scale_label] = items
-        # return stright/reversed items matrices
-        return items_by_scale, reversed_items_by_scale
-
-    def compute_raw_score_component(self, items_by_scale: pd.DataFrame, fillna_value: int) -> pd.DataFrame:
-        # clone item answers
-        answers = self.answers.copy()
-        # compute raw scores
-        raw_scores = np.dot(answers.fillna(fillna_value).sub(fillna_value).abs(), items_by_scale)
-        # return matrices as pandas dataframes
-        return pd.DataFrame(raw_scores, index=self.answers.index, columns=self.scales)
-
-    def compute_raw_scores(self) -> tuple[pd.DataFrame, pd.DataFrame]:
-        # set fillna value for straight items
-        fillna_value = 0
-        # compute scores
-        raw_scores_straight = self.compute_raw_score_component(self.straight_items_by_scale, fillna_value)
-        # set fillna value for reverse items
-        fillna_value = sum(self.test_specs.get_spec("likert").values())
-        # compute reversed items
-        raw_scores_reversed = self.compute_raw_score_component(self.reversed_items_by_scale, fillna_value)
-        # return results
-        return raw_scores_straight, raw_scores_reversed
-
-    def compute_scores(self) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
-        # intercept numpy errors
-        with np.errstate(divide='ignore', invalid='ignore'):
-            # get items by scale and type of item
-            count_items_straight, count_items_reversed = self.count_items_by_scale
-            # get missing items by scale and type of item
-            missing_items_straight, missing_items_reversed = self.missing_items_by_scale
-            # get raw scores by scale
-            raw_scores_straight, raw_scores_reversed = self.compute_raw_scores()
-            # init list of components for computing corrected raw scores (i.e., take into account missing items)
-            corrected_raw_components = []
-            # compute corrected raw scores
-            for sum_scores, missing_items_by_scale, count_items_by_scale in [
-                (raw_scores_straight, missing_items_straight, count_items_straight),
-                (raw_scores_reversed, missing_items_reversed, count_items_reversed)
-            ]:
-                # compute how many items where effectively responded (by scale)
-                items_with_answers_by_scale = missing_items_by_scale.rsub(count_items_by_scale)
-                # compute mean responses
-                mean_results = np.true_divide(sum_scores, items_with_answers_by_scale)
-                # replace NaNs, Infs with 0
-                mean_results = np.nan_to_num(mean_results, nan=0, posinf=0, neginf=0)
-                # compute corrected results
-                corrected_results = mean_results * count_items_by_scale.to_numpy()
-                # append corrected results to list
-                corrected_raw_components.append(corrected_results)
-            # assemble raw scores dataframe
-            corrected_raw_scores = pd.DataFrame(sum(corrected_raw_components), index=self.answers.index, columns=self.scales)
-            # compute mean scores
-            mean_scores = (
-                raw_scores_straight + raw_scores_reversed).div(count_items_straight.sub(missing_items_straight) + count_items_reversed.sub(missing_items_reversed)
-            )
-            # replace NaNs, Infs with 0
-            mean_scores = np.nan_to_num(mean_scores, nan=np.nan, posinf=np.nan, neginf=np.nan)
-            # convert mean_scores to dataframe
-            mean_scores = pd.DataFrame(mean_scores, index=self.answers.index, columns=self.scales)
-            # return results
-            return raw_scores_straight + raw_scores_reversed, corrected_raw_scores.astype(int), mean_scores.round(2)
-
-    def compute_standard_scores(self, raw_scores, norms: pd.DataFrame, norms_col: str) -> pd.DataFrame:
+    def kernel_scores(self) -> dict[str, np.ndarray]:
+        # score requested scales at once
+        return ScoringKernel(self.test_specs.compiled, self.scale_indices).score(*self.kernel_answers, scores=self.outputs.get_kernel_scores())
+
+    def to_frame(self, scores: np.ndarray) -> pd.DataFrame:
+        # wrap scores into a dataframe
+        return pd.DataFrame(scores, index=self.test_data.index, columns=self.scales)
+
+    @PROFILER.profile("scorer.standard_scores", rows=len)
+    def compute_standard_scores(self, raw_scores: pd.DataFrame, norms: pd.DataFrame, norms_col: str) -> pd.DataFrame:
+        # init standard scores (rows without available norms are left empty)
+        standard_scores = pd.DataFrame(np.nan, index=raw_scores.index, columns=raw_scores.columns, dtype=object)
         # if norms is an empty dataframe
         if norms.empty:
-            # return empty dataframe with the same structure of raw_scores
-            return pd.DataFrame().reindex_like(raw_scores)
-        # function to take standard scores
-        def get_standard_scores(series, **kwargs):
-            # get kwargs
-            norms, norms_col = kwargs["norms"], kwargs["norms_col"]
-            # determine values for pivot table
-            values_for_pivot_table = [c for c in ['std','std_interpretation'] if c in norms.columns]
-            # prepare norms table
-            # need to pivot in case user requested multiple norms
-            norms = ( norms
-                    .pivot_table(index=['scale','raw'], columns=['norms_id'], values=values_for_pivot_table, aggfunc=lambda x: x)
-                    .reset_index()
-            )
-            # flatten multilevel columns index
-            norms = pd.DataFrame(norms.to_records())
-            # clean up columns labels
-            norms.columns = [ "_".join(re.findall(r'\b\w+\b', c)) for c in norms.columns ]
-            # drop unwnated column
-            norms = norms.drop(columns="index")
-            # determine wich norms to use for current scale
-            norms_to_use = norms[norms["scale"].eq(series.name)]
-            # get standard scores
-            stds = pd.merge_asof(
-                series.to_frame().reset_index().sort_values(by=series.name),
-                norms_to_use.sort_values(by="raw"), # type: ignore
-                left_on=series.name,
-                right_on="raw",
-                direction="nearest"
-            )
-            # reset index to re-establish original order of series
-            stds = stds.set_index("index").sort_index()
-            # return from fourth column onwards
-            return stds.iloc[:,3:].add_prefix(f"{norms.iloc[0,0]}_").to_dict(orient="records")
+            # return empty standard scores
+            return standard_scores
+        # get compiled norms
+        compiled_norms = self.compiled_norms
+        # get raw scores as a rows x scales array of integers
+        raw_scores_array = raw_scores.to_numpy(dtype=np.int64)
+        # get distinct combinations of norms ids, so that each one is resolved only once
+        norms_codes, norms_combinations = pd.factorize(self.norms["norms_id"])
+        # iterate over combinations of norms ids
+        for norms_code, norms_ids in enumerate(norms_combinations):
+            # get requested norms
+            norms_indices = compiled_norms.get_norms_indices(norms_ids)
+            # if none of the requested norms is available
+            if not norms_indices:
+                # skip combination
+                continue
+            # get rows using current combination
+            rows = np.flatnonzero(norms_codes == norms_code)
+            # init labelled columns of standard scores (i.e., one for each field and norms)
+            labelled_columns = []
+            # iterate over norms fields and requested norms
+            for field in compiled_norms.fields:
+                for norms_index in norms_indices:
+                    # gather standard scores of all scales in one shot
+                    values = compiled_norms.lookup(field, norms_index, raw_scores_array[rows], self.scale_indices)
+                    # convert gathered values into python objects
+                    values = self.decode_norms_values(compiled_norms, field, values)
+                    # store column label (without scale prefix) and values
+                    labelled_columns.append((f"{field}_{compiled_norms.norms_ids[norms_index]}", values))
+            # iterate over scales
+            for scale_index, scale in enumerate(raw_scores.columns):
+                # build keys of standard scores dicts
+                keys = [ f"{scale}_{label}" for label, _ in labelled_columns ]
+                # build standard scores dicts
+                standard_scores.iloc[rows, scale_index] = pd.Series(
+                    [ dict(zip(keys, row)) for row in zip(*[ values[:, scale_index] for _, values in labelled_columns ]) ],
+                    dtype=object
+                ).to_numpy()
         # return standard scores
-        return raw_scores.apply(get_standard_scores, norms=norms, norms_col=norms_col)
-
-    def score(self, type_of_norms: str = "std"):
-        # compute missing items for each scale
-        missing_by_scale = sum(self.missing_items_by_scale)
-        # compute raw scores for each scale
-        raw_scores, corrected_raw_scores, mean_scores = self.compute_scores()
-        # compute std scores for each scale
-        standardized_scores = self.compute_standard_scores(corrected_raw_scores, self.test_norms, type_of_norms)
+        return standard_scores
+
+    @PROFILER.profile("scorer.standard_scores", rows=len)
+    def compute_flat_standard_scores(self, raw_scores: pd.DataFrame, norms: pd.DataFrame) -> pd.DataFrame:
+        # get compiled norms
+        compiled_norms = self.compiled_norms
+        # get raw scores as a rows x scales array of integers
+        raw_scores_array = raw_scores.to_numpy(dtype=np.int64)
+        # get distinct combinations of norms ids, so that each one is resolved only once
+        norms_codes, norms_combinations = pd.factorize(self.norms["norms_id"])
+        # init standard scores columns
+        columns: dict[tuple[str, str, str], pd.Series] = {}
+        # iterate over available norms
+        for norms_index, norms_id in enumerate(compiled_norms.norms_ids):
+            # determine which combinations request current norms
+            requested = np.array([ norms_index in compiled_norms.get_norms_indices(str(norms_ids)) for norms_ids in norms_combinations ] + [ False ])
+            # determine which rows request current norms (factorize marks missing norms_id with -1)
+            rows = requested[norms_codes]
+            # iterate over norms fields
+            for field in compiled_norms.fields:
+                # gather standard scores of all rows and scales in one shot
+                values = compiled_norms.lookup(field, norms_index, raw_scores_array, self.scale_indices)
+                # iterate over scales
+                for scale_index, scale in enumerate(raw_scores.columns):
+                    # store typed column, leaving empty rows not requesting current norms
+                    columns[(scale, norms_id, field)] = self.to_typed_norms_column(compiled_norms, field, values[:, scale_index], rows, raw_scores.index)
+        # sort columns by scale, then by norms id and field
+        labels = [ (scale, norms_id, field) for scale in raw_scores.columns for norms_id in compiled_norms.norms_ids for field in compiled_norms.fields ]
+        # return standard scores as flat columns (e.g., s1_ita_all_norm_std)
+        return pd.DataFrame({ "_".join(label): columns[label] for label in labels }, index=raw_scores.index)
+
+    def to_typed_norms_column(self, compiled_norms: CompiledNorms, field: str, values: np.ndarray, rows: np.ndarray, index: pd.Index) -> pd.Series:
+        # if field is categorical
+        if field in compiled_norms.categories:
+            # return categorical column (code -1 marks missing values)
+            return pd.Series(pd.Categorical.from_codes(np.where(rows, values, -1), categories=compiled_norms.categories[field]), index=index)
+        # blank rows not requesting current norms
+        values = np.where(rows, values, np.nan)
+        # return numeric column (nullable integers if field only holds integers)
+        return pd.Series(values, index=index).astype("Int64" if field in compiled_norms.integer_fields else "float64")
+
+    def decode_norms_values(self, compiled_norms: CompiledNorms, field: str, values: np.ndarray) -> np.ndarray:
+        # if field is categorical
+        if field in compiled_norms.categories:
+            # map codes to categories (missing categories become NaN)
+            return np.array(compiled_norms.categories[field] + [np.nan], dtype=object)[values]
+        # if field only holds integers
+        if field in compiled_norms.integer_fields:
+            # convert to python ints, leaving NaNs untouched
+            return np.array([ int(value) if value == value else value for value in values.ravel().tolist() ], dtype=object).reshape(values.shape)
+        # return values
+        return values.astype(object)
+
+    @PROFILER.profile("scorer.summary", rows=lambda report: report.rows)
+    def summarize(self) -> SummaryReport:
+        # get compiled specifications and norms
+        compiled_specs = self.test_specs.compiled
+        compiled_norms = self.compiled_norms
+        # get corrected raw scores and missing items of requested scales
+        corrected_raw_scores, missing_by_scale = self.kernel_scores["corrected_raw"], self.kernel_scores["missing"]
+        # get answers
+        answers, _ = self.kernel_answers
+        # get distinct norms ids (missing norms ids are coded as -1)
+        norms_codes, norms_combinations = pd.factorize(self.norms["norms_id"])
+        # get categorical norms fields of each row, for all norms (e.g., std_interpretation)
+        interpretations = [
+            (field, norms_id, compiled_norms.categories[field], compiled_norms.lookup(field, norms_index, corrected_raw_scores, self.scale_indices),
+                np.array([ norms_index in compiled_norms.get_norms_indices(str(norms_ids)) for norms_ids in norms_combinations ] + [ False ])[norms_codes])
+                    for field in compiled_norms.categories for norms_index, norms_id in enumerate(compiled_norms.norms_ids)
+        ]
+        # init report
+        report = SummaryReport()
+        report.rows = len(self.test_data)
+        # iterate over scales
+        for scale_index, scale in enumerate(self.scales):
+            # get items of scale
+            straight_items = compiled_specs.straight[:, compiled_specs.scales.index(scale)].nonzero()[0]
+            reversed_items = compiled_specs.reversed[:, compiled_specs.scales.index(scale)].nonzero()[0]
+            # get rows answering all items of scale
+            complete = missing_by_scale[:, scale_index] == 0
+            # iterate over distinct norms ids
+            for norms_code, norms_ids in enumerate(norms_combinations):
+                # get rows using current norms ids
+                rows = norms_codes == norms_code
+                # get item scores of rows answering all items (reversed items are scored as |answer - (likert.min + likert.max)|)
+                complete_rows = np.flatnonzero(rows & complete)
+                complete_item_scores = np.hstack([
+                    answers[np.ix_(complete_rows, straight_items)].astype(np.float64),
+                    np.abs(answers[np.ix_(complete_rows, reversed_items)].astype(np.float64) - compiled_specs.reversal_offset)
+                ])
+                # update scale summary
+                scale_summary = report.get_scale_summary(str(norms_ids), scale, len(straight_items) + len(reversed_items))
+                scale_summary.update(corrected_raw_scores[rows, scale_index], missing_by_scale[rows, scale_index], complete_item_scores)
+                # count categories of categorical norms fields (code -1 marks missing categories)
+                for field, norms_id, categories, codes, requested in interpretations:
+                    if requested[rows].any():
+                        scale_summary.count(field, norms_id, categories, np.bincount(codes[rows & requested, scale_index] + 1, minlength=len(categories) + 1)[1:])
+        # return report
+        return report
+
+    def score(self, type_of_norms: str = "std", flat_norms: bool = False):
+        # get requested blocks
+        blocks = self.outputs.blocks
+        # init results with norms ids (and item answers, if they should be echoed)
+        results = [ self.norms, *([ self.answers ] if "answers" in blocks else []) ]
+        # add requested scores for each scale (missing items, raw, corrected raw and mean scores), computed by the kernel
+        results.extend(self.to_frame(self.kernel_scores[block]).add_prefix(f"{block}_") for block in KERNEL_SCORES if block in blocks)
+        # if standard scores are requested
+        if "std" in blocks:
+            # get corrected raw scores for each scale
+            corrected_raw_scores = self.to_frame(self.kernel_scores["corrected_raw"])
+            # compute std scores for each scale (either as typed flat columns or as dict-like columns)
+            standardized_scores = (
+                self.compute_flat_standard_scores(corrected_raw_scores, self.test_norms)
+                    if flat_norms
+                    else self.compute_standard_scores(corrected_raw_scores, self.test_norms, type_of_norms)
+            )
+            # add standard scores
+            results.append(standardized_scores.add_prefix(f"{type_of_norms}_"))
         # return results
-        return pd.concat([
-            self.norms,
-            self.answers,
-            missing_by_scale.add_prefix("missing_"), # type: ignore
-            raw_scores.add_prefix("raw_"),
-            corrected_raw_scores.add_prefix("corrected_raw_"),
-            mean_scores.add_prefix("mean_"),
-            standardized_scores.add_prefix(f"{type_of_norms}_"),
-        ], axis=1)
+        return pd.concat(results, axis=1)
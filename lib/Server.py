@@ -0,0 +1,155 @@
+import sys
+import json
+import pandas as pd
+
+from typing import Any, TextIO
+from socketserver import ThreadingMixIn, UnixStreamServer
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from lib.Filer import Filer
+from lib.Loader import Loader
+from lib.Pipeline import Pipeline
+from lib.Scorer import ScoreOutputs
+from lib.Sanitizer import Sanitizer
+from lib.Registry import TestRegistry
+from lib.Errors import NotFoundError, ValidationError
+
+class ScoringService():
+
+    def __init__(self, filer: Filer) -> None:
+        self.filer = filer
+        # load all tests once, keeping compiled specs and norms warm
+        self.pipelines = self.load_pipelines()
+
+    def load_pipelines(self) -> dict[str, Pipeline]:
+        # init Loader
+        loader = Loader(self.filer)
+        # init pipelines
+        pipelines = {}
+        # iterate over available tests
+        for test in TestRegistry(self.filer.get_base_folderpath("tests")).get_tests():
+            # init pipeline
+            pipeline = Pipeline(loader, test)
+            # compile test specifications and norms
+            pipeline.test_specs.compiled
+            pipeline.compiled_norms
+            # store pipeline
+            pipelines[test] = pipeline
+        # return pipelines
+        return pipelines
+
+    def score(self, request: dict[str, Any]) -> str:
+        # get requested test
+        test = request.get("test", "")
+        # if test is not available
+        if test not in self.pipelines:
+            # raise error
+            raise NotFoundError(f"'{test}' is not an available test.")
+        # get pipeline and item labels of test
+        pipeline = self.pipelines[test]
+        item_labels = pipeline.test_specs.item_labels
+        # get respondents records
+        records = request.get("records")
+        # if records are missing
+        if not isinstance(records, list) or not all(isinstance(record, dict) for record in records):
+            # raise error
+            raise ValidationError("'records' should be a list of respondent records.")
+        # iterate over records
+        for index, record in enumerate(records):
+            # get item keys of record
+            item_keys = set(record.keys()) - { "norms_id" }
+            # if some item keys are unknown or missing
+            if item_keys != set(item_labels):
+                # raise error
+                raise ValidationError(f"Record {index} has unknown items {sorted(item_keys - set(item_labels))} and missing items {sorted(set(item_labels) - item_keys)} (expected {item_labels[0]}...{item_labels[-1]}).")
+        # convert records to test data (norms_id first, then items in the order of test specifications, whatever the order of keys)
+        test_data = pd.DataFrame.from_records(records, columns=[ "norms_id", *item_labels ]) if any("norms_id" in record for record in records) else pd.DataFrame.from_records(records, columns=item_labels)
+        # get requested blocks and scales of results (e.g., { "outputs": ["corrected_raw", "std"], "scales": ["risk"] }, everything if missing)
+        outputs = ScoreOutputs(request.get("outputs"), request.get("scales"))
+        # sanitize test data (data-quality reports are not accumulated across requests, since they would grow unbounded and are shared by threads)
+        sanitized_test_data = Sanitizer(pipeline.test_specs, test_data).sanitize()
+        # score test data (standard scores are returned as flat columns, unless otherwise requested)
+        test_results = pipeline.score_sanitized(sanitized_test_data, bool(request.get("expand_norms", True)), outputs=outputs)
+        # return json response
+        return f'{{"test": {json.dumps(test)}, "results": {test_results.to_json(orient="records", default_handler=str)}}}'
+
+    def handle(self, payload: str | bytes) -> tuple[bool, str]:
+        try:
+            # score request
+            return True, self.score(json.loads(payload))
+        # on error
+        except Exception as e:
+            # return error response
+            return False, json.dumps({ "error": str(e) })
+
+    def serve_lines(self, fin: TextIO = sys.stdin, fout: TextIO = sys.stdout) -> None:
+        # iterate over json-lines requests
+        for line in fin:
+            # skip empty lines
+            if not line.strip():
+                continue
+            # handle request and write response on its own line
+            fout.write(self.handle(line)[1] + "\n")
+            fout.flush()
+
+class ScoringRequestHandler(BaseHTTPRequestHandler):
+
+    @property
+    def service(self) -> ScoringService:
+        # scoring service is shared by all requests through the server
+        return self.server.service # type: ignore
+
+    def address_string(self) -> str:
+        # unix sockets have no client address
+        return str(self.client_address[0]) if self.client_address else "unix"
+
+    def send_json(self, status: int, body: str) -> None:
+        # encode body
+        encoded_body = body.encode()
+        # send headers and body
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(encoded_body)))
+        self.end_headers()
+        self.wfile.write(encoded_body)
+
+    def do_GET(self) -> None:
+        # list available tests
+        if self.path == "/tests":
+            self.send_json(200, json.dumps(list(self.service.pipelines.keys())))
+        # report liveness
+        elif self.path == "/health":
+            self.send_json(200, json.dumps({ "status": "ok" }))
+        # otherwise
+        else:
+            self.send_json(404, json.dumps({ "error": f"'{self.path}' doesn't exist." }))
+
+    def do_POST(self) -> None:
+        # if path is not the scoring endpoint
+        if self.path != "/score":
+            # notify error
+            self.send_json(404, json.dumps({ "error": f"'{self.path}' doesn't exist." }))
+            # stop
+            return
+        # read request body
+        payload = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        # handle request
+        success, body = self.service.handle(payload)
+        # send response
+        self.send_json(200 if success else 400, body)
+
+class ThreadingUnixHTTPServer(ThreadingMixIn, UnixStreamServer):
+
+    daemon_threads = True
+
+    def server_bind(self) -> None:
+        # bind unix socket (HTTPServer.server_bind expects a host and port)
+        UnixStreamServer.server_bind(self)
+        self.server_name, self.server_port = "unix", 0
+
+def make_server(service: ScoringService, host: str = "127.0.0.1", port: int = 8765, socket_path: str | None = None) -> ThreadingHTTPServer | ThreadingUnixHTTPServer:
+    # init unix socket server if a socket path is given, otherwise a localhost tcp server
+    server = ThreadingUnixHTTPServer(socket_path, ScoringRequestHandler) if socket_path else ThreadingHTTPServer((host, port), ScoringRequestHandler)
+    # share scoring service with request handlers
+    server.service = service # type: ignore
+    # return server
+    return server
@@ -0,0 +1,261 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+
+from pathlib import Path
+from typing import Any
+from lib.Filer import Filer, DATA_FORMATS, save_json
+from lib.Pipeline import Pipeline
+from lib.Writer import Writer
+from lib.Errors import NotFoundError, ValidationError
+
+# suffix of folders holding shards of a data file (e.g., data/data_core.shards/) and their scored data (e.g., xerox/data_core.shards/)
+SHARDS_SUFFIX = ".shards"
+# name of the manifest of shards, stored with shards data
+MANIFEST_FILENAME = "manifest.json"
+
+class Sharder():
+
+    def __init__(self, filer: Filer, pipeline: Pipeline, data_filename: str) -> None:
+        self.filer = filer
+        self.pipeline = pipeline
+        self.data_filename = data_filename
+        # determine folderpaths of shards data and of scored shards data (e.g., data/data_core.shards, xerox/data_core.shards)
+        self.shards_folderpath = filer.get_base_folderpath("data") / f"{Path(data_filename).stem}{SHARDS_SUFFIX}"
+        self.scored_shards_folderpath = filer.get_base_folderpath("xerox") / f"{Path(data_filename).stem}{SHARDS_SUFFIX}"
+
+    def get_hashes(self) -> dict[str, str]:
+        # return hashes of test specifications and norms, which scored shards must share
+        return { "specs_hash": self.pipeline.test_specs.compiled.hash, "norms_hash": self.pipeline.compiled_norms.hash }
+
+    def count_rows(self, data_filepath: Path) -> int:
+        # if data is stored as parquet, read number of rows from metadata
+        if data_filepath.suffix == DATA_FORMATS["parquet"]:
+            import pyarrow.parquet as pq
+            return pq.ParquetFile(data_filepath).metadata.num_rows
+        # if data is stored as arrow ipc (feather), read number of rows from the memory-mapped file
+        if data_filepath.suffix in [ DATA_FORMATS["feather"], ".arrow" ]:
+            import pyarrow as pa
+            import pyarrow.ipc as ipc
+            return ipc.open_file(pa.memory_map(str(data_filepath))).read_all().num_rows
+        # otherwise count lines of csv file, without parsing them (first line is the header)
+        lines, last_byte = 0, b"\n"
+        with data_filepath.open("rb") as fin:
+            while block := fin.read(1 << 24):
+                lines += block.count(b"\n")
+                last_byte = block[-1:]
+        # return number of rows (last line may lack a trailing newline)
+        return max(lines - 1 + (last_byte != b"\n"), 0)
+
+    def split(self, number_of_shards: int, chunksize: int = 0) -> dict[str, Any]:
+        # if number of shards is not valid
+        if number_of_shards < 1:
+            # raise error
+            raise ValidationError("Number of shards should be at least 1.")
+        # determine data filepath
+        data_filepath = self.filer.get_base_folderpath("data") / self.data_filename
+        # if data file is missing
+        if not data_filepath.exists():
+            # raise error
+            raise NotFoundError(f"'{self.data_filename}' doesn't exist.")
+        # determine data format of shards (same as data file)
+        data_format = next((data_format for data_format, suffix in DATA_FORMATS.items() if suffix == data_filepath.suffix), "csv")
+        # determine first row of each shard (contiguous row ranges, as even as possible)
+        rows = self.count_rows(data_filepath)
+        starts = np.array([ rows * shard_id // number_of_shards for shard_id in range(number_of_shards) ])
+        # create shards folder, removing previous manifest (so that a partially split data file is never scored)
+        self.shards_folderpath.mkdir(parents=True, exist_ok=True)
+        (self.shards_folderpath / MANIFEST_FILENAME).unlink(missing_ok=True)
+        # remove shards of a previous split
+        for shard_filepath in self.shards_folderpath.glob("shard_*"):
+            shard_filepath.unlink()
+        # init one writer and one row counter for each shard
+        shard_filenames = [ f"shard_{shard_id:05d}{DATA_FORMATS[data_format]}" for shard_id in range(number_of_shards) ]
+        writers = [ Writer(self.shards_folderpath / shard_filename, data_format) for shard_filename in shard_filenames ]
+        shard_rows = [ 0 ] * number_of_shards
+        # init index of first row of current chunk and columns of data (i.e., an empty chunk)
+        offset, empty_data = 0, None
+        try:
+            # iterate over chunks of data (a few chunks per shard, if chunksize is not given)
+            for data in self.pipeline.loader.load_test_data_in_chunks(self.data_filename, chunksize or max(1, -(-rows // (number_of_shards * 4))), self.pipeline.test_specs):
+                # determine shard of each row (rows beyond the counted ones go to the last shard)
+                shard_ids = np.searchsorted(starts, np.arange(offset, offset + len(data)), side="right") - 1
+                # iterate over shards of chunk rows
+                for shard_id in np.unique(shard_ids):
+                    # append rows to shard
+                    shard_data = data.iloc[np.flatnonzero(shard_ids == shard_id)]
+                    writers[shard_id].append(shard_data)
+                    shard_rows[shard_id] += len(shard_data)
+                # update offset and columns of data
+                offset, empty_data = offset + len(data), data.iloc[:0]
+            # if data file holds no rows
+            if empty_data is None or not offset:
+                # raise error
+                raise ValidationError(f"'{self.data_filename}' holds no rows to split.")
+            # write columns of empty shards (e.g., more shards than rows), so that every shard can be scored
+            for writer in writers:
+                if not writer.chunks:
+                    writer.append(empty_data)
+        finally:
+            # close writers
+            for writer in writers:
+                writer.close()
+        # build manifest (row offsets are the ones effectively written)
+        manifest = {
+            "test": self.pipeline.test,
+            "data_filename": self.data_filename,
+            "data_format": data_format,
+            "rows": int(sum(shard_rows)),
+            **self.get_hashes(),
+            "shards": [
+                { "id": shard_id, "filename": shard_filename, "start": int(sum(shard_rows[:shard_id])), "stop": int(sum(shard_rows[:shard_id + 1])), "rows": shard_rows[shard_id] }
+                    for shard_id, shard_filename in enumerate(shard_filenames)
+            ],
+        }
+        # store manifest last, once shards are complete
+        save_json(manifest, self.shards_folderpath / MANIFEST_FILENAME)
+        # return manifest
+        return manifest
+
+    def load_manifest(self) -> dict[str, Any]:
+        # if manifest is missing
+        if not (self.shards_folderpath / MANIFEST_FILENAME).exists():
+            # raise error
+            raise NotFoundError(f"'{self.data_filename}' was not split into shards.")
+        # load manifest
+        with (self.shards_folderpath / MANIFEST_FILENAME).open() as fin:
+            manifest = json.load(fin)
+        # if shards belong to another test, or test specifications or norms changed after splitting
+        if manifest["test"] != self.pipeline.test or any(manifest[key] != value for key, value in self.get_hashes().items()):
+            # raise error
+            raise ValidationError(f"Shards of '{self.data_filename}' were created for different test specifications or norms, split data again.")
+        # return manifest
+        return manifest
+
+    def get_shard(self, manifest: dict[str, Any], shard_id: int) -> dict[str, Any]:
+        # if shard is not in manifest
+        if not 0 <= shard_id < len(manifest["shards"]):
+            # raise error
+            raise NotFoundError(f"Shard {shard_id} doesn't exist (choose from 0 to {len(manifest['shards']) - 1}).")
+        # return shard entry
+        return manifest["shards"][shard_id]
+
+    def get_shard_data_filename(self, shard: dict[str, Any]) -> str:
+        # return filename of shard data, relative to data folder
+        return f"{self.shards_folderpath.name}/{shard['filename']}"
+
+    def get_scored_shard_filepath(self, shard: dict[str, Any], output_format: str) -> Path:
+        # create scored shards folder
+        self.scored_shards_folderpath.mkdir(parents=True, exist_ok=True)
+        # return filepath of scored shard (e.g., xerox/data_core.shards/shard_00000_scored.csv)
+        return self.scored_shards_folderpath / f"{Path(shard['filename']).stem}_scored{DATA_FORMATS[output_format]}"
+
+    def get_shard_state_filepath(self, shard: dict[str, Any], output_format: str) -> Path:
+        # return filepath of the state of scored shard, stored next to its scored data (e.g., xerox/data_core.shards/shard_00000_scored.csv.json)
+        scored_shard_filepath = self.get_scored_shard_filepath(shard, output_format)
+        return scored_shard_filepath.with_name(f"{scored_shard_filepath.name}.json")
+
+    def reset_shard_state(self, shard: dict[str, Any], output_format: str) -> None:
+        # remove state of scored shard, so that a shard being scored again is never merged before completion
+        self.get_shard_state_filepath(shard, output_format).unlink(missing_ok=True)
+
+    def save_shard_state(self, shard: dict[str, Any], output_format: str) -> None:
+        # store state of scored shard (written once scored data are complete)
+        save_json({ "id": shard["id"], "rows": shard["rows"], **self.get_hashes() }, self.get_shard_state_filepath(shard, output_format))
+
+    def merge(self, output_format: str) -> Path:
+        # load manifest (test specifications and norms must not have changed since splitting)
+        manifest = self.load_manifest()
+        # determine filepaths of scored shards
+        scored_shard_filepaths = [ self.get_scored_shard_filepath(shard, output_format) for shard in manifest["shards"] ]
+        # iterate over shards
+        for shard, scored_shard_filepath in zip(manifest["shards"], scored_shard_filepaths):
+            # load state of scored shard
+            try:
+                with self.get_shard_state_filepath(shard, output_format).open() as fin:
+                    shard_state = json.load(fin)
+            # on error (i.e., shard was not scored yet, or is being scored)
+            except OSError:
+                raise NotFoundError(f"Shard {shard['id']} was not scored yet.")
+            # if shard was scored with different test specifications or norms
+            if any(shard_state[key] != value for key, value in self.get_hashes().items()) or not scored_shard_filepath.exists():
+                # raise error
+                raise ValidationError(f"Shard {shard['id']} was scored with different test specifications or norms, score it again.")
+        # determine filepath of merged scored data (e.g., xerox/data_core_scored.csv)
+        test_results_filepath = self.filer.get_base_folderpath("xerox") / f"{Path(self.data_filename).stem}_scored{DATA_FORMATS[output_format]}"
+        # write to a temporary file first, so that previous scored data are replaced only once merged data are complete
+        temp_filepath = test_results_filepath.with_name(f"{test_results_filepath.stem}.{os.getpid()}.tmp{test_results_filepath.suffix}")
+        try:
+            # merge scored shards in original row order
+            merge = self.merge_csv if output_format == "csv" else self.merge_arrow
+            merge(manifest["shards"], scored_shard_filepaths, temp_filepath, output_format)
+            # replace previous scored data
+            os.replace(temp_filepath, test_results_filepath)
+        finally:
+            # remove temporary file, if still there
+            temp_filepath.unlink(missing_ok=True)
+        # return filepath of merged scored data
+        return test_results_filepath
+
+    def check_rows(self, shard: dict[str, Any], rows: int) -> None:
+        # if scored shard is incomplete
+        if rows != shard["rows"]:
+            # raise error
+            raise ValidationError(f"Shard {shard['id']} holds {rows} scored rows instead of {shard['rows']}, score it again.")
+
+    def merge_csv(self, shards: list[dict[str, Any]], scored_shard_filepaths: list[Path], filepath: Path, _: str) -> None:
+        # init header of merged data
+        header = None
+        # copy lines of scored shards, without parsing them
+        with filepath.open("wb") as fout:
+            # iterate over scored shards
+            for shard, scored_shard_filepath in zip(shards, scored_shard_filepaths):
+                with scored_shard_filepath.open("rb") as fin:
+                    # get header of scored shard (empty shards may lack it)
+                    shard_header = fin.readline()
+                    # if shard doesn't share the header of previous shards
+                    if shard_header and header and shard_header != header:
+                        # raise error
+                        raise ValidationError(f"Shard {shard['id']} was scored with different outputs, score it again.")
+                    # write header once
+                    if shard_header and not header:
+                        header = shard_header
+                        fout.write(header)
+                    # copy rows of scored shard, counting them
+                    rows = 0
+                    while block := fin.read(1 << 24):
+                        rows += block.count(b"\n")
+                        fout.write(block)
+                    # make sure scored shard is complete
+                    self.check_rows(shard, rows)
+
+    def merge_arrow(self, shards: list[dict[str, Any]], scored_shard_filepaths: list[Path], filepath: Path, output_format: str) -> None:
+        # init columns of merged data and empty scored shard
+        columns, empty_test_results = None, None
+        # append scored shards one at a time (schemas must match)
+        with Writer(filepath, output_format) as writer:
+            # iterate over scored shards
+            for shard, scored_shard_filepath in zip(shards, scored_shard_filepaths):
+                # read scored shard
+                test_results = pd.read_parquet(scored_shard_filepath) if output_format == "parquet" else pd.read_feather(scored_shard_filepath)
+                # make sure scored shard is complete
+                self.check_rows(shard, len(test_results))
+                # if shard doesn't share the columns of previous shards
+                if columns is not None and list(test_results.columns) != columns:
+                    # raise error
+                    raise ValidationError(f"Shard {shard['id']} was scored with different outputs, score it again.")
+                columns = list(test_results.columns)
+                # skip empty shards, since their columns have no values to infer types from (e.g., categorical norms ids become dictionaries of nulls)
+                if test_results.empty:
+                    empty_test_results = test_results
+                    continue
+                try:
+                    # append scored shard
+                    writer.append(test_results)
+                # on error (i.e., shard doesn't share the schema of previous shards)
+                except ValidationError:
+                    raise ValidationError(f"Shard {shard['id']} was scored with different outputs, score it again.")
+            # if all shards are empty, write columns of merged data
+            if not writer.chunks and empty_test_results is not None:
+                writer.append(empty_test_results)
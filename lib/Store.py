@@ -0,0 +1,122 @@
+import json
+import numpy as np
+import pandas as pd
+
+from pathlib import Path
+from typing import Any, Iterable, Iterator
+from functools import cached_property
+from lib.Filer import save_json
+from lib.Loader import TestSpecs
+from lib.Sanitizer import QualityReport
+from lib.Errors import NotFoundError, ValidationError
+
+# files of a response store (e.g., data/data_core.store/answers.bin)
+STORE_ANSWERS_FILENAME = "answers.bin"
+STORE_NORMS_FILENAME = "norms_codes.bin"
+STORE_META_FILENAME = "store.json"
+
+class ResponseStore():
+
+    def __init__(self, folderpath: Path) -> None:
+        self.folderpath = folderpath
+        # if store (i.e., its sidecar, written last) is missing
+        if not (folderpath / STORE_META_FILENAME).exists():
+            # raise error
+            raise NotFoundError(f"'{folderpath}' is not a response store.")
+        # load sidecar (layout, norms ids, specifications hash)
+        with (folderpath / STORE_META_FILENAME).open() as fin:
+            self.meta: dict[str, Any] = json.load(fin)
+        self.rows: int = self.meta["rows"]
+        self.columns: list[str] = self.meta["columns"]
+        self.missing_value: int = self.meta["missing_value"]
+
+    @staticmethod
+    def get_storage_dtype(test_specs: TestSpecs) -> np.dtype:
+        # get likert range
+        likert_min, likert_max = test_specs.get_spec("likert.min"), test_specs.get_spec("likert.max")
+        # return smallest integer dtype holding any answer plus a missing sentinel (its minimum value)
+        return np.dtype(next(dtype for dtype in [ np.int8, np.int16, np.int32, np.int64 ] if np.iinfo(dtype).min < likert_min and likert_max <= np.iinfo(dtype).max))
+
+    @classmethod
+    def create(cls, folderpath: Path, test_specs: TestSpecs, sanitized_chunks: Iterable[pd.DataFrame], quality_report: QualityReport | None = None) -> "ResponseStore":
+        # create store folder
+        folderpath.mkdir(parents=True, exist_ok=True)
+        # remove previous sidecar, so that a partially converted store is never opened
+        (folderpath / STORE_META_FILENAME).unlink(missing_ok=True)
+        # get storage dtype and missing sentinel
+        storage_dtype = cls.get_storage_dtype(test_specs)
+        missing_value = int(np.iinfo(storage_dtype).min)
+        # init layout, norms ids and number of rows
+        columns: list[str] | None = None
+        norms_ids: dict[str, int] = {}
+        rows = 0
+        # write answers and norms codes row by row block (so that data larger than memory can be converted)
+        with (folderpath / STORE_ANSWERS_FILENAME).open("wb") as answers_out, (folderpath / STORE_NORMS_FILENAME).open("wb") as norms_out:
+            # iterate over sanitized chunks
+            for sanitized_chunk in sanitized_chunks:
+                # get item answers
+                answers = sanitized_chunk.drop(columns=["norms_id"])
+                # store layout of first chunk, next ones must match it
+                columns = columns or list(map(str, answers.columns))
+                if list(map(str, answers.columns)) != columns:
+                    raise ValidationError("Chunks of data don't share the same columns.")
+                # write answers (missing answers are stored as sentinel)
+                answers_out.write(answers.to_numpy(dtype=np.float64, na_value=missing_value).astype(storage_dtype).tobytes())
+                # map norms ids of chunk to codes shared by all chunks
+                norms = sanitized_chunk["norms_id"].astype("category")
+                chunk_codes = np.array([ norms_ids.setdefault(str(norms_id), len(norms_ids)) for norms_id in norms.cat.categories ], dtype=np.int32)
+                # write norms codes
+                norms_out.write(chunk_codes[norms.cat.codes.to_numpy()].tobytes())
+                # update number of rows
+                rows += len(sanitized_chunk)
+        # write sidecar last, once data are complete
+        meta = {
+            "test": test_specs.get_spec("name"),
+            "specs_hash": test_specs.compiled.hash,
+            "rows": rows,
+            "columns": columns or [],
+            "dtype": storage_dtype.name,
+            "missing_value": missing_value,
+            "norms_ids": list(norms_ids.keys()),
+            "quality_report": quality_report.to_dict() if quality_report else None,
+        }
+        save_json(meta, folderpath / STORE_META_FILENAME)
+        # return store
+        return cls(folderpath)
+
+    def check(self, test_specs: TestSpecs) -> None:
+        # if store was converted with different specifications
+        if self.meta["specs_hash"] != test_specs.compiled.hash or len(self.columns) != test_specs.get_spec("length"):
+            # raise error
+            raise ValidationError(f"'{self.folderpath.name}' was converted with different test specifications, convert data again.")
+
+    @cached_property
+    def answers(self) -> np.ndarray:
+        # memory map answers (pages are shared by all processes reading the store)
+        return np.memmap(self.folderpath / STORE_ANSWERS_FILENAME, dtype=self.meta["dtype"], mode="r", shape=(self.rows, len(self.columns))) if self.rows else np.empty((0, len(self.columns)), dtype=self.meta["dtype"])
+
+    @cached_property
+    def norms_codes(self) -> np.ndarray:
+        # memory map norms codes
+        return np.memmap(self.folderpath / STORE_NORMS_FILENAME, dtype=np.int32, mode="r", shape=(self.rows,)) if self.rows else np.empty(0, dtype=np.int32)
+
+    def get_rows(self, start: int, stop: int) -> tuple[pd.DataFrame, tuple[np.ndarray, np.ndarray]]:
+        # get answers of rows (a view of the memory map) and missing answers mask
+        answers = self.answers[start:stop]
+        missing_mask = answers == self.missing_value
+        # get norms ids of rows
+        norms = pd.Categorical.from_codes(self.norms_codes[start:stop], categories=self.meta["norms_ids"])
+        # wrap buffers into a sanitized dataframe, without copying answers
+        index = pd.RangeIndex(start, start + len(answers))
+        sanitized_data = pd.DataFrame({
+            "norms_id": pd.Series(norms, index=index),
+            **{ column: pd.Series(pd.arrays.IntegerArray(answers[:, i], missing_mask[:, i]), index=index, copy=False) for i, column in enumerate(self.columns) }
+        }, copy=False)
+        # return sanitized data, along with answers and missing mask for the scoring kernel
+        return sanitized_data, (answers, missing_mask)
+
+    def iter_rows(self, chunksize: int) -> Iterator[tuple[int, int]]:
+        # yield row ranges of chunks (the whole store if chunksize is 0)
+        chunksize = chunksize or max(self.rows, 1)
+        for start in range(0, self.rows, chunksize):
+            yield start, min(start + chunksize, self.rows)
@@ -0,0 +1,137 @@
+import numpy as np
+
+from typing import Any
+
+def to_json_number(value: Any) -> float | None:
+    # return value as a json number (undefined statistics become null)
+    return None if value is None or not np.isfinite(value) else round(float(value), 4)
+
+class Moments():
+
+    def __init__(self, count: int = 0, mean: np.ndarray | float = 0.0, m2: np.ndarray | float = 0.0) -> None:
+        # init number of values, mean and sum of squared deviations from the mean (by column, if values are vectors)
+        self.count = count
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.m2 = np.asarray(m2, dtype=np.float64)
+
+    @classmethod
+    def from_values(cls, values: np.ndarray) -> "Moments":
+        # if there are no values
+        if not len(values):
+            return cls()
+        # compute moments of values (by column, if values are rows x columns)
+        mean = values.mean(axis=0)
+        return cls(len(values), mean, ((values - mean) ** 2).sum(axis=0))
+
+    def add(self, other: "Moments") -> "Moments":
+        # if other moments are empty, keep current ones
+        if not other.count:
+            return self
+        # if current moments are empty, take other ones
+        if not self.count:
+            self.count, self.mean, self.m2 = other.count, other.mean.copy(), other.m2.copy()
+            return self
+        # merge moments in one step (Chan et al. parallel algorithm), so that chunks never need a second pass
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean = self.mean + delta * other.count / count
+        self.m2 = self.m2 + other.m2 + delta ** 2 * self.count * other.count / count
+        self.count = count
+        # return moments
+        return self
+
+    @property
+    def variance(self) -> np.ndarray:
+        # return sample variance (undefined with less than two values)
+        return self.m2 / (self.count - 1) if self.count > 1 else np.full_like(self.m2, np.nan)
+
+class ScaleSummary():
+
+    def __init__(self, number_of_items: int) -> None:
+        self.number_of_items = number_of_items
+        # init moments of corrected raw scores (all rows)
+        self.scores = Moments()
+        # init number of missing items
+        self.missing_items = 0
+        # init moments of item scores and total scores of rows answering all items (used by Cronbach's alpha)
+        self.items = Moments(0, np.zeros(number_of_items), np.zeros(number_of_items))
+        self.totals = Moments()
+        # init counts of categorical norms fields (e.g., { "std_interpretation": { "ita_all_norm": { "basso": 10 } } })
+        self.interpretations: dict[str, dict[str, dict[str, int]]] = {}
+
+    def update(self, scores: np.ndarray, missing_items: np.ndarray, complete_item_scores: np.ndarray) -> None:
+        # add moments of corrected raw scores
+        self.scores.add(Moments.from_values(scores.astype(np.float64)))
+        # add missing items
+        self.missing_items += int(missing_items.sum())
+        # add moments of item scores and total scores (of rows answering all items)
+        self.items.add(Moments.from_values(complete_item_scores))
+        self.totals.add(Moments.from_values(complete_item_scores.sum(axis=1)))
+
+    def count(self, field: str, norms_id: str, categories: list[str], counts: np.ndarray) -> None:
+        # add counts of field categories
+        category_counts = self.interpretations.setdefault(field, {}).setdefault(norms_id, {})
+        for category, cells in zip(categories, counts.tolist()):
+            if cells:
+                category_counts[str(category)] = category_counts.get(str(category), 0) + cells
+
+    def add(self, other: "ScaleSummary") -> "ScaleSummary":
+        # merge moments and missing items
+        self.scores.add(other.scores)
+        self.missing_items += other.missing_items
+        self.items.add(other.items)
+        self.totals.add(other.totals)
+        # merge counts of categorical norms fields
+        for field, norms_counts in other.interpretations.items():
+            for norms_id, category_counts in norms_counts.items():
+                for category, cells in category_counts.items():
+                    self.count(field, norms_id, [ category ], np.array([ cells ]))
+        # return summary
+        return self
+
+    @property
+    def alpha(self) -> float | None:
+        # Cronbach's alpha is undefined with less than two items or without total score variance
+        if self.number_of_items < 2 or self.totals.count < 2 or not self.totals.m2 > 0:
+            return None
+        # return Cronbach's alpha of rows answering all items
+        return self.number_of_items / (self.number_of_items - 1) * (1 - self.items.variance.sum() / self.totals.variance)
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "count": self.scores.count,
+            "mean": to_json_number(self.scores.mean) if self.scores.count else None,
+            "variance": to_json_number(self.scores.variance),
+            "missing_rate": to_json_number(self.missing_items / (self.scores.count * self.number_of_items)) if self.scores.count and self.number_of_items else None,
+            "alpha": to_json_number(self.alpha),
+            "alpha_count": self.totals.count,
+            "interpretations": self.interpretations,
+        }
+
+class SummaryReport():
+
+    def __init__(self) -> None:
+        # init number of summarized rows
+        self.rows = 0
+        # init summaries by norms id and scale (e.g., { "ita_all_norm": { "s1": ScaleSummary } })
+        self.groups: dict[str, dict[str, ScaleSummary]] = {}
+
+    def get_scale_summary(self, norms_id: str, scale: str, number_of_items: int) -> ScaleSummary:
+        # return summary of scale within norms group (created on first use)
+        return self.groups.setdefault(norms_id, {}).setdefault(scale, ScaleSummary(number_of_items))
+
+    def add(self, other: "SummaryReport") -> "SummaryReport":
+        # add rows of other report (e.g., of another chunk or shard)
+        self.rows += other.rows
+        # merge summaries of other report
+        for norms_id, scales in other.groups.items():
+            for scale, scale_summary in scales.items():
+                self.get_scale_summary(norms_id, scale, scale_summary.number_of_items).add(scale_summary)
+        # return report
+        return self
+
+    def to_dict(self) -> dict:
+        return {
+            "rows": self.rows,
+            "norms_ids": { norms_id: { scale: scale_summary.to_dict() for scale, scale_summary in scales.items() } for norms_id, scales in self.groups.items() },
+        }
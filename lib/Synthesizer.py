@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+
+from typing import Any
+from lib.Loader import TestSpecs
+from lib.Sanitizer import UNAVAILABLE_NORMS
+
+# norms id used for synthetic rows with invalid norms
+INVALID_NORMS = "invalid_norms"
+
+class Synthesizer():
+
+    def __init__(self, test_specs: TestSpecs, seed: int = 0) -> None:
+        self.test_specs = test_specs
+        self.rng = np.random.default_rng(seed)
+
+    def get_norms_mix(self, invalid_norms_rate: float) -> dict[str, float]:
+        # get available norms
+        available_norms = self.test_specs.get_spec("norms") or []
+        # valid norms ids are single norms plus the combination of all of them
+        valid_norms_ids = available_norms + ([ " ".join(available_norms) ] if len(available_norms) > 1 else [])
+        # if there are no valid norms ids
+        if not valid_norms_ids:
+            # all rows get invalid norms
+            invalid_norms_rate = 1.0
+        # init mix with valid norms ids, sharing evenly the valid rate
+        norms_mix = { norms_id: (1 - invalid_norms_rate) / len(valid_norms_ids) for norms_id in valid_norms_ids }
+        # add invalid norms ids, sharing evenly the invalid rate
+        norms_mix.update({ norms_id: invalid_norms_rate / 2 for norms_id in [ UNAVAILABLE_NORMS, INVALID_NORMS ] })
+        # return mix
+        return norms_mix
+
+    def generate(self, rows: int, missing_rate: float = 0.05, invalid_norms_rate: float = 0.05, norms_mix: dict[str, float] | None = None) -> pd.DataFrame:
+        # get test length and likert range
+        length = self.test_specs.get_spec("length")
+        likert_min, likert_max = self.test_specs.get_spec("likert.min"), self.test_specs.get_spec("likert.max")
+        # get mix of norms ids
+        norms_mix = norms_mix or self.get_norms_mix(invalid_norms_rate)
+        # draw norms ids as categorical codes
+        norms_ids = list(norms_mix.keys())
+        probabilities = np.array(list(norms_mix.values()), dtype=np.float64)
+        norms_codes = self.rng.choice(len(norms_ids), size=rows, p=probabilities / probabilities.sum())
+        # init synthetic data with norms ids
+        data: dict[str, Any] = { "norms_id": pd.Categorical.from_codes(norms_codes, categories=norms_ids) }
+        # iterate over items
+        for item in range(length):
+            # draw answers within likert range
+            answers = self.rng.integers(likert_min, likert_max + 1, size=rows, dtype=np.int16)
+            # draw missing answers
+            missing = self.rng.random(rows) < missing_rate
+            # store answers as nullable integers
+            data[f"i{item + 1}"] = pd.arrays.IntegerArray(answers, missing)
+        # return synthetic data
+        return pd.DataFrame(data)
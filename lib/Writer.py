@@ -0,0 +1,97 @@
+import pandas as pd
+
+from pathlib import Path
+from typing import Any
+from lib.Filer import DATA_FORMATS
+from lib.Errors import ValidationError
+from lib.Profiler import PROFILER
+
+class Writer():
+
+    def __init__(self, filepath: Path, data_format: str = "csv") -> None:
+        # if data format is not supported
+        if data_format not in DATA_FORMATS:
+            # raise error
+            raise ValidationError(f"'{data_format}' is not a supported data format.")
+        self.filepath = filepath
+        self.data_format = data_format
+        # init arrow writer and schema (used when appending to columnar files)
+        self.arrow_writer: Any = None
+        self.arrow_schema: Any = None
+        # init number of appended chunks
+        self.chunks = 0
+
+    def __enter__(self) -> "Writer":
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+    def write(self, data: pd.DataFrame) -> None:
+        # write data as a single stage
+        with PROFILER.stage("write", len(data)):
+            # if data should be stored as csv
+            if self.data_format == "csv":
+                data.to_csv(self.filepath, index=False)
+            # if data should be stored as parquet
+            elif self.data_format == "parquet":
+                data.to_parquet(self.filepath, index=False)
+            # if data should be stored as arrow ipc (feather)
+            else:
+                data.reset_index(drop=True).to_feather(self.filepath)
+
+    def append(self, data: pd.DataFrame) -> None:
+        # write chunk as a single stage
+        with PROFILER.stage("write", len(data)):
+            # if data should be stored as csv
+            if self.data_format == "csv":
+                # first chunk creates file and header, next ones are appended
+                data.to_csv(self.filepath, index=False, mode="a" if self.chunks else "w", header=not self.chunks)
+            # otherwise
+            else:
+                # append chunk to columnar file
+                self.append_arrow(data)
+        # update number of appended chunks
+        self.chunks += 1
+
+    def append_arrow(self, data: pd.DataFrame) -> None:
+        # import pyarrow (optional dependency, only needed for columnar formats)
+        import pyarrow as pa
+        import pyarrow.ipc as ipc
+        import pyarrow.parquet as pq
+        # convert chunk to arrow table
+        table = pa.Table.from_pandas(data, preserve_index=False)
+        # if this is the first chunk
+        if self.arrow_writer is None:
+            # store schema of the file
+            self.arrow_schema = table.schema
+            # if data should be stored as arrow ipc (feather)
+            if self.data_format == "feather":
+                # store categorical columns as plain values, since ipc files allow a single dictionary per column
+                # and categories may change between chunks (e.g., combinations of norms ids)
+                self.arrow_schema = pa.schema([
+                    field.with_type(field.type.value_type) if pa.types.is_dictionary(field.type) else field
+                        for field in self.arrow_schema
+                ], metadata=self.arrow_schema.metadata)
+            # open writer
+            self.arrow_writer = (
+                pq.ParquetWriter(self.filepath, self.arrow_schema)
+                    if self.data_format == "parquet"
+                    else ipc.new_file(str(self.filepath), self.arrow_schema)
+            )
+        try:
+            # make sure chunk matches the schema of the file
+            table = table.cast(self.arrow_schema)
+        # on error
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError, ValueError) as e:
+            # raise error
+            raise ValidationError(f"Chunk {self.chunks} doesn't match the schema of '{self.filepath.name}': {e}")
+        # append chunk
+        self.arrow_writer.write_table(table)
+
+    def close(self) -> None:
+        # if an arrow writer is open
+        if self.arrow_writer is not None:
+            # close it
+            self.arrow_writer.close()
+            self.arrow_writer = None
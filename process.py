@@ -1,65 +1,242 @@
+import json
 import argparse
-import pandas as pd
 
 from pathlib import Path
-from lib.Filer import Filer, TESTS_PATH
-from lib.Loader import Loader
-from lib.Sanitizer import Sanitizer, UNAVAILABLE_NORMS
-from lib.Scorer import Scorer
-from lib.Errors import TracebackNotifier
-from lib.Utils import expand_dict_like_columns
-# available tests list
-available_tests = [ f.name for f in TESTS_PATH.glob("[!.]*") if f.is_dir ]
+from lib.Filer import DATA_FORMATS, STORE_SUFFIX
+from lib.Registry import TestRegistry
+from lib.Errors import TracebackNotifier, ValidationError
+# init test registry (cached manifest of available tests, rebuilt only when tests change)
+registry = TestRegistry()
 
 # argparse
 parser = argparse.ArgumentParser(prog="Scoring Machine")
-parser.add_argument("-t", "--test", required=True, choices=available_tests)
+test_group = parser.add_mutually_exclusive_group(required=True)
+test_group.add_argument("-t", "--test", choices=registry.get_tests())
+test_group.add_argument("-l", "--list", action="store_true", help="list available tests and exit")
+test_group.add_argument("--tests", type=lambda tests: tests.split(","), help="comma separated list of tests scored from one wide data file (columns are prefixed with test name, e.g. core_i1, core_norms_id)")
+parser.add_argument("-d", "--data", default=None, help="filename of data file in data folder (defaults to data_<test>.<input_format>)")
 parser.add_argument("-e", "--expand_norms", choices=["0", "1"], default="0")
+parser.add_argument("-i", "--input_format", choices=[ *DATA_FORMATS.keys(), "store" ], default="csv", help="store reads data converted with --convert")
+parser.add_argument("-o", "--output_format", choices=list(DATA_FORMATS.keys()), default="csv", help="columnar formats always store standard scores as flat typed columns")
+parser.add_argument("-c", "--chunksize", type=int, default=0, help="score data in chunks of CHUNKSIZE rows (0 = load all data at once)")
+parser.add_argument("-p", "--profile", choices=["console", "json"], default=None, help="report wall time, rows/sec and peak memory of each stage")
+parser.add_argument("-w", "--workers", type=int, default=1, help="number of worker processes used for scoring")
+parser.add_argument("-q", "--quality_report", choices=["0", "1"], default="0", help="store counts of coerced, clipped and missing answers and of invalid norms")
+parser.add_argument("--convert", action="store_true", help="convert data file into a memory-mapped response store (data/<name>.store) and exit")
+parser.add_argument("-u", "--incremental", choices=["0", "1"], default="0", help="score only new or changed rows, reusing previous results")
+parser.add_argument("--outputs", type=lambda blocks: blocks.split(","), default=None, help="comma separated list of result blocks to compute and store, among answers, missing, raw, corrected_raw, mean, std (defaults to all of them)")
+parser.add_argument("--scales", type=lambda scales: scales.split(","), default=None, help="comma separated list of scales to compute and store (defaults to all of them)")
+parser.add_argument("-s", "--summary", choices=["0", "1"], default="0", help="store counts, means, variances, missing rates, interpretations and Cronbach's alpha of scales, by norms id")
+shards_group = parser.add_mutually_exclusive_group()
+shards_group.add_argument("--split", type=int, default=0, metavar="SHARDS", help="split data file into SHARDS row-range shards (data/<name>.shards) and exit")
+shards_group.add_argument("--shard", type=int, default=None, help="score shard SHARD of a data file split with --split (e.g., on one node of a cluster sharing the filesystem)")
+shards_group.add_argument("--merge", action="store_true", help="merge scored shards of a data file split with --split into xerox/<name>_scored.<output_format> and exit")
 args = parser.parse_args()
+# if some of the tests of a wide data file are not available
+if args.tests and set(args.tests) - set(registry.get_tests()):
+    # notify error
+    parser.error(f"argument --tests: invalid choice: {sorted(set(args.tests) - set(registry.get_tests()))} (choose from {registry.get_tests()})")
+# if a wide data file is not specified
+if args.tests and not args.data:
+    # notify error
+    parser.error("argument -d/--data is required with --tests")
+# if scales are requested for a wide data file
+if args.tests and args.scales:
+    # notify error (scales are specific to each test)
+    parser.error("argument --scales: not allowed with argument --tests")
+
+# if available tests should be listed
+if args.list:
+    # notify available tests
+    for test in registry.get_tests():
+        entry = registry.get_test(test)
+        print(f"{test:<20}{entry['length']:>4} items  scales: {', '.join(entry['scales'])}  norms: {', '.join(entry['norms']['ids']) or '-'}")
+    # stop
+    raise SystemExit(0)
 
 try:
+    # import scoring modules only now, since they load pandas and numpy
+    from lib.Filer import Filer
+    from lib.Loader import Loader
+    from lib.Pipeline import Pipeline
+    from lib.Dispatcher import Dispatcher
+    from lib.Writer import Writer
+    from lib.Scorer import ScoreOutputs
+    from lib.Profiler import PROFILER
     # determine filename of test data file
-    test_data_filename = f"data_{args.test}.csv"
+    test_data_filename = args.data or f"data_{args.test}{ STORE_SUFFIX if args.input_format == 'store' else DATA_FORMATS[args.input_format] }"
+    # determine whether standard scores should be stored as flat typed columns (columnar formats can't store dicts)
+    expand_norms = args.expand_norms == "1" or args.output_format != "csv"
+    # determine blocks and scales of results (everything, unless otherwise requested)
+    outputs = ScoreOutputs(args.outputs, args.scales, args.summary == "1")
+    # if stages should be profiled
+    if args.profile:
+        # enable profiler
+        PROFILER.enable()
     # init Filer
     filer = Filer()
     # init Loader
     loader = Loader(filer)
-    # load test assets
-    test_specs, test_all_norms = loader.load_test_specifications_and_norms(args.test)
-    # load data to score
-    test_data = loader.load_test_data(test_data_filename)
-    # init Sanitizer
-    sanitizer = Sanitizer(test_specs, test_data)
-    # sanitize data
-    sanitized_test_data = sanitizer.sanitize()
-    # init test results
-    test_results = pd.DataFrame()
-    # loop through test data grouped by norms id
-    for norms_ids, group_test_data in sanitized_test_data.groupby("norms_id", sort=False):
-        # split norm_ids
-        norms_list = norms_ids.split(" ") # type: ignore
-        # get norms
-        test_norms = (
-            test_all_norms[test_all_norms["norms_id"].isin(norms_list)]
-                if norms_list[0] != UNAVAILABLE_NORMS
-                else pd.DataFrame()
-        )
-        # init scorer
-        scorer = Scorer(test_specs, test_norms, group_test_data) # type: ignore
-        # add score
-        test_results = pd.concat([ test_results, scorer.score() ])
-    # reset index
-    test_results = test_results.reset_index()
-    # if dict-like columns should be expanded
-    if args.expand_norms == "1":
-        # expand dict-like columns
-        test_results = expand_dict_like_columns(test_results, "std_")
-    # rebuild original index
-    test_results = test_results.set_index("index").sort_index()
+    # init pipeline of a single test (wide data files are scored by a Batch, without one) and response store
+    pipeline, store = None, None
+    # if several tests should be scored from one wide data file
+    if args.tests:
+        # import batch
+        from lib.Batch import Batch
+        # init Batch (loads test assets of all tests, and collects their reports)
+        scoring_engine = reporter = Batch(loader, args.tests, args.workers)
+    # otherwise
+    else:
+        # init Pipeline (loads test assets, and collects reports)
+        reporter = pipeline = Pipeline(loader, args.test)
+        # if scoring should run on multiple processes, dispatch work to a pool of workers
+        scoring_engine = Dispatcher(pipeline, args.workers) if args.workers > 1 else pipeline
+        # make sure requested scales are available, before any result is stored
+        outputs.get_scale_indices(pipeline.test_specs)
     # determine path of results data file
-    test_results_filepath= filer.get_base_folderpath("xerox") / f"{Path(test_data_filename).stem}_scored.csv"
-    # store results data
-    test_results.to_csv(test_results_filepath, index=False)
+    test_results_filepath= filer.get_base_folderpath("xerox") / f"{Path(test_data_filename).stem}_scored{DATA_FORMATS[args.output_format]}"
+    # if a summary is requested, but data are not scored all over again
+    if args.summary == "1" and (args.convert or args.incremental == "1" or args.split or args.merge):
+        # raise error (summaries are accumulated while scoring all rows)
+        raise ValidationError("Summaries are not available when converting data, scoring them incrementally, splitting or merging shards.")
+    # if a data-quality report is requested, but only new or changed rows are sanitized
+    if args.quality_report == "1" and args.incremental == "1":
+        # raise error (reports would only cover rescored rows)
+        raise ValidationError("Data-quality reports are not available when scoring data incrementally.")
+    # init sharder and scored shard (only used when data are split into shards, or shards are scored or merged)
+    sharder, shard = None, None
+    # if data should be split into shards, or shards should be scored or merged
+    if args.split or args.shard is not None or args.merge:
+        # if wide data files or response stores are involved
+        if pipeline is None or args.convert or args.input_format == "store":
+            # raise error
+            raise ValidationError("Shards are not available for wide data files or response stores.")
+        # import sharder
+        from lib.Sharder import Sharder
+        # init Sharder
+        sharder = Sharder(filer, pipeline, test_data_filename)
+        # if a shard should be scored
+        if args.shard is not None:
+            # get shard (test specifications and norms must not have changed since splitting)
+            shard = sharder.get_shard(sharder.load_manifest(), args.shard)
+            # score shard data into its own results data file (e.g., xerox/data_core.shards/shard_00000_scored.csv)
+            test_data_filename = sharder.get_shard_data_filename(shard)
+            test_results_filepath = sharder.get_scored_shard_filepath(shard, args.output_format)
+            # mark shard as not scored, until its results data are complete
+            sharder.reset_shard_state(shard, args.output_format)
+    # if data should be split into shards
+    if sharder is not None and args.split:
+        # split data (all shards are written in one pass)
+        manifest = sharder.split(args.split, args.chunksize)
+        # notify shards
+        print(f"Split {manifest['rows']} rows into {len(manifest['shards'])} shards in {sharder.shards_folderpath}")
+    # if scored shards should be merged
+    elif sharder is not None and args.merge:
+        # merge scored shards in original row order
+        merged_filepath = sharder.merge(args.output_format)
+        # notify merged data
+        print(f"Merged scored shards into {merged_filepath}")
+    # if data should be converted into a response store
+    elif args.convert:
+        # if a wide data file should be converted
+        if pipeline is None:
+            # raise error
+            raise ValidationError("Response stores are not available for wide data files.")
+        # import response store
+        from lib.Store import ResponseStore
+        # determine store folderpath
+        store_folderpath = filer.get_base_folderpath("data") / f"{Path(test_data_filename).stem}{STORE_SUFFIX}"
+        # iterate over sanitized chunks of data (all data at once, if chunksize is 0)
+        sanitized_chunks = (
+            pipeline.sanitize(test_data)
+                for test_data in (
+                    loader.load_test_data_in_chunks(test_data_filename, args.chunksize, pipeline.test_specs)
+                        if args.chunksize > 0
+                        else [ loader.load_test_data(test_data_filename, pipeline.test_specs) ]
+                )
+        )
+        # store sanitized data
+        store = ResponseStore.create(store_folderpath, pipeline.test_specs, sanitized_chunks, pipeline.quality_report)
+        # notify store
+        print(f"Stored {store.rows} rows in {store_folderpath}")
+    # if data should be read from a response store
+    elif args.input_format == "store":
+        # if a wide data file should be read from a response store
+        if not isinstance(scoring_engine, (Pipeline, Dispatcher)):
+            # raise error
+            raise ValidationError("Response stores are not available for wide data files.")
+        # open store (answers are memory mapped, not parsed)
+        store = loader.load_test_store(test_data_filename)
+        # init Writer
+        with Writer(test_results_filepath, args.output_format) as writer:
+            # iterate over scored chunks of store
+            for test_results in scoring_engine.score_store(store, args.chunksize, expand_norms, outputs):
+                # append results data as soon as they are ready
+                writer.append(test_results)
+    # if only new or changed rows should be scored
+    elif args.incremental == "1":
+        # if several tests should be scored from one wide data file
+        if pipeline is None or not isinstance(scoring_engine, (Pipeline, Dispatcher)):
+            # raise error
+            raise ValidationError("Incremental scoring is not available for wide data files.")
+        # if data should be streamed in chunks
+        if args.chunksize > 0:
+            # raise error (rows are matched against the whole previous results)
+            raise ValidationError("Incremental scoring can't be combined with chunked scoring.")
+        # import rescorer
+        from lib.Rescorer import Rescorer
+        # load data to score
+        test_data = loader.load_test_data(test_data_filename, pipeline.test_specs)
+        # score new or changed rows, reusing previous results
+        rescored_rows = Rescorer(pipeline, test_results_filepath, args.output_format, expand_norms, outputs).rescore(test_data, scoring_engine)
+        # notify number of scored rows
+        print(f"Scored {rescored_rows} of {len(test_data)} rows.")
+    # otherwise
+    else:
+        # init Writer
+        with Writer(test_results_filepath, args.output_format) as writer:
+            # if data should be streamed in chunks
+            if args.chunksize > 0:
+                # iterate over scored chunks
+                for test_results in scoring_engine.stream(test_data_filename, args.chunksize, expand_norms, outputs):
+                    # append results data as soon as they are ready
+                    writer.append(test_results)
+            # otherwise
+            else:
+                # load data to score
+                test_data = loader.load_test_data(test_data_filename, None if pipeline is None else pipeline.test_specs)
+                # score data
+                test_results = scoring_engine.score(test_data, expand_norms, outputs)
+                # store results data
+                writer.write(test_results)
+    # if scoring ran on pools of workers, shut them down
+    if not isinstance(scoring_engine, Pipeline):
+        scoring_engine.close()
+    # if a shard was scored
+    if sharder is not None and shard is not None:
+        # mark shard as scored
+        sharder.save_shard_state(shard, args.output_format)
+    # if data-quality report should be stored
+    if args.quality_report == "1" and not (args.split or args.merge):
+        # store data-quality report next to results
+        with test_results_filepath.with_name(f"{Path(test_data_filename).stem}_quality.json").open("w") as fout:
+            json.dump(
+                store.meta["quality_report"] if store is not None
+                    else reporter.get_quality_report()
+            , fout, indent=2)
+    # if summary report should be stored
+    if args.summary == "1":
+        # store summary report next to results
+        with test_results_filepath.with_name(f"{Path(test_data_filename).stem}_summary.json").open("w") as fout:
+            json.dump(reporter.get_summary_report(), fout, indent=2)
+    # if stages should be profiled on console
+    if args.profile == "console":
+        # print profiling summary
+        print(PROFILER.format_summary())
+    # if stages should be profiled as json
+    elif args.profile == "json":
+        # store profiling summary next to results
+        PROFILER.save(test_results_filepath.with_name(f"{Path(test_data_filename).stem}_profile.json"))
 # on error
 except Exception as e:
     # notify error message
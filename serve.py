@@ -0,0 +1,41 @@
+import os
+import argparse
+
+from lib.Filer import Filer
+from lib.Server import ScoringService, make_server
+from lib.Errors import TracebackNotifier
+
+# argparse
+parser = argparse.ArgumentParser(prog="Scoring Machine Server")
+parser.add_argument("--host", default="127.0.0.1", help="host of the http server")
+parser.add_argument("--port", type=int, default=8765, help="port of the http server")
+parser.add_argument("--socket", default=None, help="serve http over this unix socket instead of host and port")
+parser.add_argument("--stdio", action="store_true", help="serve json-lines requests over stdin/stdout instead of http")
+args = parser.parse_args()
+
+try:
+    # init scoring service (loads and compiles all tests once)
+    service = ScoringService(Filer())
+    # if requests come through stdin/stdout
+    if args.stdio:
+        # serve json-lines requests
+        service.serve_lines()
+    # otherwise
+    else:
+        # if a stale unix socket exists
+        if args.socket and os.path.exists(args.socket):
+            # remove it
+            os.unlink(args.socket)
+        # init http server
+        with make_server(service, args.host, args.port, args.socket) as server:
+            # serve requests until interrupted
+            server.serve_forever()
+# on keyboard interrupt
+except KeyboardInterrupt:
+    pass
+# on error
+except Exception as e:
+    # notify error message
+    print(e)
+    # notify traceback
+    TracebackNotifier(e).notify_traceback()